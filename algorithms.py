@@ -1,21 +1,40 @@
+import os
+import sys
 import time
-import data_api.state                  as state_api
+import queue
+import random
+import threading
+import multiprocessing
+import data_api.state_cache            as state_cache
+import data_api.constraints            as cons_api
+import data_api.solution               as solution_api
+import data_api.decomposition          as decomposition
 import optimizer.perturbation          as perturbation
 import optimizer.grasp                 as grasp
 import optimizer.local_search          as local_search
 import optimizer.variable_neighborhood as vns
 import optimizer.simulated_annealing   as sa
+import optimizer.progress              as progress
+from utilities.my_types import Snapshot
 
 
-def update_solution(state, best_grade, best_state):
+"""
+Returns (best_grade, best_solution) after an optimizer run that left state
+with its timetable (see solution_api.snapshot).
+"""
+def update_solution(state, best_grade, best_solution):
     if state.grade["totalScore"] > best_grade:
-        return (state.grade["totalScore"], state)
+        return (state.grade["totalScore"], solution_api.snapshot(state))
     else:
-        return (best_grade, best_state)
+        return (best_grade, best_solution)
 
 
+"""
+Runs optimizer on optimizer_args["state"] until CPU_TIME_SEC passes or grade 0 is reached.
+Returns the State with the best timetable of all runs.
+"""
 def iterate(CPU_TIME_SEC, optimizer, **optimizer_args):
-    best_grade, best_state = float("-inf"), optimizer_args["state"]
+    best_grade, best_solution = float("-inf"), None
     start_time = time.time()
     optimizer_args["CPU_TIME_SEC"] = CPU_TIME_SEC
     optimizer_args["start_time"] = start_time
@@ -23,7 +42,7 @@ def iterate(CPU_TIME_SEC, optimizer, **optimizer_args):
     while True:
         try:
             state = optimizer(**optimizer_args)
-            best_grade, best_state = update_solution(state, best_grade, best_state)
+            best_grade, best_solution = update_solution(state, best_grade, best_solution)
             if best_grade == 0:
                 break
 
@@ -35,28 +54,37 @@ def iterate(CPU_TIME_SEC, optimizer, **optimizer_args):
         except KeyboardInterrupt:
             break
 
+    state = optimizer_args["state"]
+    if best_solution is not None and not solution_api.is_current(state, best_solution):
+        solution_api.restore(state, best_solution)
     print(f"BEST_GRADE: {best_grade}")
-    return best_state
+    return state
 
 
-def grasp_iterate(CPU_TIME_SEC, num_candidates, num_restrict):
-    return iterate(CPU_TIME_SEC, grasp_search, state=state_api.get_state(), num_candidates=num_candidates, num_restrict=num_restrict)
+"""
+Entry points below start from a prepared State (see state_cache.get_prepared_state)
+and take an optional seed for state.rng.
+The same seed on the same input gives the same timetable, as long as
+the run isn't cut short by CPU_TIME_SEC.
+"""
+def grasp_iterate(CPU_TIME_SEC, num_candidates, num_restrict, seed=None):
+    return iterate(CPU_TIME_SEC, grasp_search, state=state_cache.get_prepared_state(seed), num_candidates=num_candidates, num_restrict=num_restrict)
 
 
-def repeated_local_search(CPU_TIME_SEC):
-    return iterate(CPU_TIME_SEC, local_search_basic, state=state_api.get_state())
+def repeated_local_search(CPU_TIME_SEC, seed=None):
+    return iterate(CPU_TIME_SEC, local_search_basic, state=state_cache.get_prepared_state(seed))
 
 
-def iterated_local_search(CPU_TIME_SEC):
-    return iterate(CPU_TIME_SEC, local_search_semi, state=state_api.get_state())
+def iterated_local_search(CPU_TIME_SEC, seed=None):
+    return iterate(CPU_TIME_SEC, local_search_semi, state=state_cache.get_prepared_state(seed))
 
 
-def simulated_annealing_iterate(CPU_TIME_SEC, temperature):
-    return iterate(CPU_TIME_SEC, simulated_annealing, state=state_api.get_state(), temperature=temperature)
+def simulated_annealing_iterate(CPU_TIME_SEC, temperature, seed=None):
+    return iterate(CPU_TIME_SEC, simulated_annealing, state=state_cache.get_prepared_state(seed), temperature=temperature)
 
 
-def vns_iterate(CPU_TIME_SEC):
-    return iterate(CPU_TIME_SEC, variable_neighborhood, state=state_api.get_state())
+def vns_iterate(CPU_TIME_SEC, seed=None):
+    return iterate(CPU_TIME_SEC, variable_neighborhood, state=state_cache.get_prepared_state(seed))
 
 
 def grasp_search(state, num_candidates, num_restrict, CPU_TIME_SEC, start_time):
@@ -88,3 +116,414 @@ def simulated_annealing(state, temperature, CPU_TIME_SEC, start_time):
     sa.run(state, temperature, CPU_TIME_SEC, start_time)
     return state
 
+
+"""
+Algorithms raced by portfolio_iterate: name -> (optimizer, optimizer_args).
+Arguments are the same defaults that cli.py uses.
+"""
+PORTFOLIO = {
+    "vns":   (variable_neighborhood, {}),
+    "sa":    (simulated_annealing,   {"temperature": 10**4}),
+    "rls":   (local_search_basic,    {}),
+    "ils":   (local_search_semi,     {}),
+    "grasp": (grasp_search,          {"num_candidates": 10, "num_restrict": 5}),
+}
+
+
+"""
+Anytime version of the entry points. Runs the algo_name PORTFOLIO algorithm
+(like iterate, with the same seed behaviour) in a background thread and yields
+a Snapshot every time the best grade improves, also within optimizer runs.
+Optimizers print nothing while they are listened to.
+The run stops when CPU_TIME_SEC passes, grade 0 is reached, stop_event
+(threading.Event) is set or the caller stops iterating, e.g.:
+    for snapshot in optimize("vns", 60):
+        if snapshot.grade["totalScore"] > -300:
+            break
+"""
+def optimize(algo_name, CPU_TIME_SEC, seed=None, stop_event=None):
+    optimizer, optimizer_args = PORTFOLIO[algo_name]
+    state      = state_cache.get_prepared_state(seed)
+    stop_event = stop_event or threading.Event()
+    snapshots  = queue.Queue()
+    runner     = threading.Thread(target=optimize_runner, daemon=True,
+                                  args=(state, optimizer, optimizer_args, CPU_TIME_SEC, stop_event, snapshots))
+    runner.start()
+    try:
+        while True:
+            snapshot = snapshots.get()
+            if snapshot is None:
+                break
+            if isinstance(snapshot, BaseException):
+                raise snapshot
+            yield snapshot
+    finally:
+        stop_event.set()
+        runner.join()
+
+
+"""
+Body of the optimize thread. Puts Snapshots of improvements into snapshots,
+then an exception raised by the optimizer (if any) and None at the end.
+Only complete timetables are snapshotted (perturbation.semi_random_timetable
+optimizes a partial one first).
+"""
+def optimize_runner(state, optimizer, optimizer_args, CPU_TIME_SEC, stop_event, snapshots):
+    best_grade = float("-inf")
+
+    def on_improvement(state, elapsed_time):
+        nonlocal best_grade
+        if state.grade["totalScore"] <= best_grade or len(state.timetable) < len(state.rasps) or \
+           None in state.timetable.values():
+            return
+        best_grade = state.grade["totalScore"]
+        snapshots.put(get_snapshot(state, elapsed_time))
+
+    progress.listen(on_improvement, stop_event)
+    try:
+        start_time = time.time()
+        while not progress.is_time_over(time.time() - start_time, CPU_TIME_SEC):
+            state = optimizer(state=state, CPU_TIME_SEC=CPU_TIME_SEC, start_time=start_time, **optimizer_args)
+            on_improvement(state, time.time() - start_time)
+            if best_grade == 0:
+                break
+    except Exception as e:
+        snapshots.put(e)
+    finally:
+        progress.listen(None, None)
+        snapshots.put(None)
+
+
+"""
+Returns a Snapshot of state's timetable and grade.
+"""
+def get_snapshot(state, elapsed_time):
+    grade     = {name : int(score) for name, score in state.grade.items()}
+    timetable = {rasp.id : slot for rasp, slot in state.timetable.items()}
+    return Snapshot(elapsed_time, grade, timetable)
+
+
+"""
+Races PORTFOLIO algorithms in parallel processes. num_workers processes run the PORTFOLIO
+algorithms in order (only the first num_workers of them if there are fewer workers,
+repeated with different seeds if there are more). By default there is one worker per
+CPU core, but at least one per algorithm.
+Workers report improvements of their best grade (see portfolio_worker) to
+the coordinator which keeps the best timetable. All workers are stopped once any of them
+reaches grade 0 or CPU_TIME_SEC passes.
+Initial constraints are built once and mapped by all workers from shared memory.
+Worker i is seeded with seed + i (seed defaults to 0).
+"""
+def portfolio_iterate(CPU_TIME_SEC, num_workers=None, seed=None):
+    algo_names  = list(PORTFOLIO.keys())
+    num_workers = num_workers or max(os.cpu_count(), len(algo_names))
+    start_time  = time.time()
+    reports     = multiprocessing.Queue()
+    stop_event  = multiprocessing.Event()
+
+    state               = state_cache.get_prepared_state(seed)
+    initial_constraints = state.initial_constraints
+    shared_memory       = cons_api.share_initial_constraints(initial_constraints)
+    shared_constraints  = (shared_memory.name, initial_constraints.packed.shape, initial_constraints.index)
+    try:
+        best_report = race_workers(algo_names, num_workers, seed or 0, CPU_TIME_SEC, start_time, reports, stop_event, shared_constraints)
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+    if not best_report:
+        print("No portfolio worker finished an optimizer run.")
+        return None
+    algo_name, seed, best_grade, best_solution = best_report
+    print(f"BEST_GRADE: {best_grade} ({algo_name}, seed={seed})")
+    solution_api.restore(state, best_solution)
+    return state
+
+
+"""
+Starts portfolio workers, collects their reports until the race is over and stops them.
+Returns the best report (see receive_report) or None.
+"""
+def race_workers(algo_names, num_workers, base_seed, CPU_TIME_SEC, start_time, reports, stop_event, shared_constraints):
+    workers = []
+    for i in range(num_workers):
+        algo_name = algo_names[i % len(algo_names)]
+        seed      = base_seed + i
+        worker = multiprocessing.Process(target=portfolio_worker, daemon=True,
+                                         args=(algo_name, seed, CPU_TIME_SEC, start_time,
+                                               reports, stop_event, shared_constraints))
+        worker.start()
+        workers.append(worker)
+    print(f"Started {num_workers} portfolio workers.")
+
+    best_report = None
+    try:
+        while not best_report or best_report[2] < 0:
+            elapsed_time = time.time() - start_time
+            if elapsed_time >= CPU_TIME_SEC or not any(worker.is_alive() for worker in workers):
+                break
+            best_report = receive_report(reports, best_report, min(1.0, CPU_TIME_SEC - elapsed_time), start_time)
+    except KeyboardInterrupt:
+        pass
+
+    # Running workers stop their optimizer and send their last improvement.
+    stop_event.set()
+    grace_time = time.time() + 5.0
+    while any(worker.is_alive() for worker in workers) and time.time() < grace_time:
+        best_report = receive_report(reports, best_report, 0.1, start_time)
+    while not reports.empty():
+        best_report = receive_report(reports, best_report, 0.1, start_time)
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+    return best_report
+
+
+"""
+Waits at most timeout seconds for one worker report (algo_name, seed, grade, solution).
+Returns the better one of the received report and best_report.
+"""
+def receive_report(reports, best_report, timeout, start_time):
+    try:
+        report = reports.get(timeout=max(timeout, 0.0))
+    except queue.Empty:
+        return best_report
+
+    algo_name, seed, grade, _ = report
+    print(f"{round(time.time() - start_time, 2)}, {algo_name} (seed={seed}): {grade}")
+    if not best_report or grade > best_report[2]:
+        return report
+    return best_report
+
+
+# Minimum seconds between two improvement reports of a portfolio worker
+# (the best timetable found in between is kept and reported with the next report)
+REPORT_INTERVAL = 0.5
+
+"""
+Portfolio worker process. Runs one PORTFOLIO algorithm on its own State
+(the prepared State of state_cache, like iterate) and reports (algo_name, seed, grade, Solution)
+of complete timetables that improve its best grade (see solution_api.snapshot). While the
+optimizer runs, reports are sent at most every REPORT_INTERVAL seconds (always on grade 0),
+an improvement found in between is kept as a pending report and sent with the next report,
+after the optimizer run or when the worker stops. Stops as soon as stop_event is set.
+shared_constraints are (name, shape, index) of the shared initial constraints, the prepared
+State is loaded with them instead of its cached ones (no copy of the matrices is made).
+"""
+def portfolio_worker(algo_name, seed, CPU_TIME_SEC, start_time, reports, stop_event, shared_constraints):
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    optimizer, optimizer_args = PORTFOLIO[algo_name]
+    shared_memory, initial_constraints = cons_api.attach_initial_constraints(*shared_constraints)
+    state = state_cache.get_prepared_state(seed, initial_constraints=initial_constraints)
+    best_grade, last_report, pending = float("-inf"), float("-inf"), None
+
+    def send_pending():
+        nonlocal last_report, pending
+        if pending:
+            reports.put(pending)
+            last_report, pending = time.time(), None
+
+    def on_improvement(state, elapsed_time, is_run_end=False):
+        nonlocal best_grade, pending
+        grade = state.grade["totalScore"]
+        if grade > best_grade and len(state.timetable) == len(state.rasps) and None not in state.timetable.values():
+            best_grade = grade
+            pending    = (algo_name, seed, grade, solution_api.snapshot(state))
+        if is_run_end or best_grade == 0 or time.time() - last_report >= REPORT_INTERVAL:
+            send_pending()
+
+    progress.listen(on_improvement, stop_event)
+    while not progress.is_time_over(time.time() - start_time, CPU_TIME_SEC):
+        try:
+            state = optimizer(state=state, CPU_TIME_SEC=CPU_TIME_SEC, start_time=start_time, **optimizer_args)
+        except KeyboardInterrupt:
+            break
+        on_improvement(state, time.time() - start_time, is_run_end=True)
+        if best_grade == 0:
+            break
+    send_pending()
+
+
+# Share of CPU_TIME_SEC that decomposed_iterate gives to the clusters,
+# the rest is left for the coordination step on the merged timetable
+CLUSTERS_TIME_SHARE = 0.8
+
+"""
+Splits the problem into clusters of independent rasps (see decomposition.get_components
+and decomposition.get_clusters, at most num_workers clusters), optimizes every cluster
+with algo_name in its own process and merges the best timetables of the clusters.
+Rooms are shared, so every cluster only gets its part of them (decomposition.partition_rooms).
+Collisions left in the merged timetable are then repaired by local search on the whole State
+(the coordination step). With one cluster (all rasps interact) this is iterate with algo_name.
+Cluster i is seeded with seed + i (seed defaults to 0).
+"""
+def decomposed_iterate(algo_name, CPU_TIME_SEC, num_workers=None, seed=None):
+    start_time = time.time()
+    state      = state_cache.get_prepared_state(seed)
+    components = decomposition.get_components(state)
+    clusters   = decomposition.get_clusters(state, components, num_workers or os.cpu_count())
+    print(f"{len(components)} independent components in {len(clusters)} clusters of {[len(cluster) for cluster in clusters]} rasps.")
+    if len(clusters) == 1:
+        optimizer, optimizer_args = PORTFOLIO[algo_name]
+        return iterate(CPU_TIME_SEC, optimizer, state=state, **optimizer_args)
+
+    room_sets   = decomposition.partition_rooms(state, clusters)
+    cluster_ids = [[rasp.id for rasp in cluster] for cluster in clusters]
+    sub_states  = [decomposition.get_sub_state(state, rasp_ids, room_ids) for rasp_ids, room_ids in zip(cluster_ids, room_sets)]
+    for i, sub_state in enumerate(sub_states):
+        sub_state.rng = random.Random((seed or 0) + i)
+    best_reports = solve_clusters(algo_name, sub_states, CPU_TIME_SEC * CLUSTERS_TIME_SHARE, start_time)
+
+    sub_solutions = [(cluster_ids[i], solution) for i, (_, solution) in best_reports.items()]
+    solution_api.restore(state, decomposition.merge_solutions(state, sub_solutions))
+    unplaced = [rasp for rasp in state.rasps if state.timetable.get(rasp) is None]
+    if unplaced:
+        perturbation.set_random_slots(state, unplaced)
+    print(f"{round(time.time() - start_time, 2)}, merged {len(best_reports)} clusters: {state.grade}")
+
+    if state.grade["totalScore"] < 0:
+        local_search.run(state, CPU_TIME_SEC, start_time)
+    print(f"BEST_GRADE: {state.grade['totalScore']}")
+    return state
+
+
+"""
+Optimizes every sub-State (see decomposition.get_sub_state) in its own process until
+all of them reach grade 0 or CPU_TIME_SEC passes. Sub-States are passed to the processes
+as they are (inherited, not pickled, where processes are forked).
+Returns {sub-State index : (grade, Solution)} of the best timetable of each sub-State that reported one.
+"""
+def solve_clusters(algo_name, sub_states, CPU_TIME_SEC, start_time):
+    reports    = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    workers = []
+    for i, sub_state in enumerate(sub_states):
+        worker = multiprocessing.Process(target=cluster_worker, daemon=True,
+                                         args=(i, algo_name, sub_state, CPU_TIME_SEC, start_time, reports, stop_event))
+        worker.start()
+        workers.append(worker)
+    print(f"Started {len(workers)} cluster workers.")
+
+    best_reports = {}
+    try:
+        while any(worker.is_alive() for worker in workers) and not is_solved(best_reports, len(workers)):
+            elapsed_time = time.time() - start_time
+            if elapsed_time >= CPU_TIME_SEC:
+                break
+            receive_cluster_report(reports, best_reports, min(1.0, CPU_TIME_SEC - elapsed_time), start_time)
+    except KeyboardInterrupt:
+        pass
+
+    # Workers stop at their next time check, their last improvements are still collected.
+    stop_event.set()
+    grace_time = time.time() + 5.0
+    while any(worker.is_alive() for worker in workers) and time.time() < grace_time:
+        receive_cluster_report(reports, best_reports, 0.1, start_time)
+    while not reports.empty():
+        receive_cluster_report(reports, best_reports, 0.1, start_time)
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+    return best_reports
+
+
+"""
+Returns True if all num_clusters clusters reported a timetable with grade 0.
+"""
+def is_solved(best_reports, num_clusters):
+    return len(best_reports) == num_clusters and all(grade == 0 for grade, _ in best_reports.values())
+
+
+"""
+Waits at most timeout seconds for one cluster report (cluster index, grade, Solution)
+and keeps it in best_reports if it's the best one of its cluster.
+"""
+def receive_cluster_report(reports, best_reports, timeout, start_time):
+    try:
+        i, grade, solution = reports.get(timeout=max(timeout, 0.0))
+    except queue.Empty:
+        return
+
+    print(f"{round(time.time() - start_time, 2)}, cluster {i}: {grade}")
+    if i not in best_reports or grade > best_reports[i][0]:
+        best_reports[i] = (grade, solution)
+
+
+"""
+Cluster worker process. Runs the algo_name PORTFOLIO algorithm (like iterate) on the
+sub-State of cluster i and reports (i, grade, Solution) after every optimizer run
+that improved its best grade. Runs stop as soon as stop_event is set.
+"""
+def cluster_worker(i, algo_name, state, CPU_TIME_SEC, start_time, reports, stop_event):
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    optimizer, optimizer_args = PORTFOLIO[algo_name]
+    best_grade = float("-inf")
+
+    progress.listen(lambda state, elapsed_time: None, stop_event)
+    while not progress.is_time_over(time.time() - start_time, CPU_TIME_SEC):
+        try:
+            state = optimizer(state=state, CPU_TIME_SEC=CPU_TIME_SEC, start_time=start_time, **optimizer_args)
+        except KeyboardInterrupt:
+            break
+        if state.grade["totalScore"] > best_grade:
+            best_grade = state.grade["totalScore"]
+            reports.put((i, best_grade, solution_api.snapshot(state)))
+        if best_grade == 0:
+            break
+
+
+"""
+Optimizes the timetables of both seasons (winter and summer) at the same time,
+each season with algo_name in its own process (like iterate, seeded with seed).
+Seasons share no rasps or semesters, so they are independent problems that only
+read the same input (rooms, professors, time structure).
+Returns {"winter": State, "summer": State} with the best timetable of each season
+(a season whose worker didn't finish is left without a timetable).
+"""
+def seasons_iterate(algo_name, CPU_TIME_SEC, seed=None):
+    start_time = time.time()
+    reports    = multiprocessing.Queue()
+    workers    = [multiprocessing.Process(target=season_worker, daemon=True,
+                                          args=(is_winter, algo_name, seed, CPU_TIME_SEC, reports))
+                  for is_winter in (True, False)]
+    for worker in workers:
+        worker.start()
+    print("Started winter and summer workers.")
+
+    solutions = {}
+    while len(solutions) < len(workers):
+        try:
+            is_winter, grade, solution = reports.get(timeout=1.0)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers) and reports.empty():
+                break
+            continue
+        except KeyboardInterrupt:
+            # Workers stop their runs too and report their best timetables.
+            continue
+        solutions[is_winter] = solution
+        print(f"{round(time.time() - start_time, 2)}, {'winter' if is_winter else 'summer'}: {grade}")
+    for worker in workers:
+        worker.join()
+
+    states = {}
+    for is_winter in (True, False):
+        state = state_cache.get_prepared_state(seed, is_winter=is_winter)
+        if is_winter in solutions:
+            solution_api.restore(state, solutions[is_winter])
+        states["winter" if is_winter else "summer"] = state
+    return states
+
+
+"""
+Season worker process. Optimizes the season's prepared State with the algo_name
+PORTFOLIO algorithm (see iterate) and reports (is_winter, grade, Solution) of the best timetable.
+"""
+def season_worker(is_winter, algo_name, seed, CPU_TIME_SEC, reports):
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    optimizer, optimizer_args = PORTFOLIO[algo_name]
+    state = state_cache.get_prepared_state(seed, is_winter=is_winter)
+    state = iterate(CPU_TIME_SEC, optimizer, state=state, **optimizer_args)
+    reports.put((is_winter, state.grade["totalScore"], solution_api.snapshot(state)))
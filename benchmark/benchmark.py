@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import random
+import runpy
+import shutil
+import argparse
+import platform
+import contextlib
+import algorithms
+import data_api.state                  as state_api
+import data_api.state_cache            as state_cache
+import data_api.time_structure         as time_api
+import optimizer.perturbation          as perturbation
+import optimizer.progress              as progress
+import utilities.input_csv_to_json     as input_csv_to_json
+
+# Repository root, instances are built and benchmarked in their own directories under it
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Phases (seconds) lower than this are never flagged as regressions (timer noise)
+MIN_REGRESSION_SEC = 0.05
+
+"""
+Builds a deterministic generated instance of num_rasps rasps in instance_path:
+    1) generate_input/generate.py is run with NUM_RASPS=num_rasps and random seeded with seed
+    2) its .csvs are copied to database/input and database/constraints
+    3) settings.json is copied, so all paths of the instance are relative to instance_path
+Returns the number of seconds the generator took.
+"""
+def build_instance(instance_path, num_rasps, seed):
+    shutil.rmtree(instance_path, ignore_errors=True)
+    os.makedirs(os.path.join(instance_path, "generate_input", "jsons"))
+    os.makedirs(os.path.join(instance_path, "database", "input"))
+    os.makedirs(os.path.join(instance_path, "database", "constraints"))
+    shutil.copy(os.path.join(REPO_PATH, "settings.json"), instance_path)
+    shutil.copy(os.path.join(REPO_PATH, "generate_input", "rrule_data.json"), os.path.join(instance_path, "generate_input"))
+
+    with open(os.path.join(REPO_PATH, "generate_input", "generate_config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config["NUM_RASPS"] = num_rasps
+    with open(os.path.join(instance_path, "generate_input", "generate_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    with working_directory(instance_path), contextlib.redirect_stdout(open(os.devnull, "w")):
+        start_time = time.time()
+        random.seed(seed)
+        runpy.run_path(os.path.join(REPO_PATH, "generate_input", "generate.py"))
+        elapsed_time = time.time() - start_time
+
+    csvs_path = os.path.join(instance_path, "generate_input", "csvs")
+    for name in os.listdir(csvs_path):
+        folder = "constraints" if name.endswith("_available.csv") else "input"
+        shutil.copy(os.path.join(csvs_path, name), os.path.join(instance_path, "database", folder))
+    return elapsed_time
+
+
+"""
+Returns a benchmark result of the instance in instance_path:
+    1) phases -> seconds of CSV load, get_state, init_rrule_objects and random construction
+    2) algorithms -> for each of algo_names, a CPU_TIME_SEC run of algorithms.optimize
+       (best grade, seconds to reach it, number of improvements, seconds run)
+All runs are seeded with seed and don't print anything.
+"""
+def benchmark_instance(instance_path, algo_names, CPU_TIME_SEC, seed):
+    phases, algorithm_results = {}, {}
+    with working_directory(instance_path):
+        phases["csv_load"] = timed(input_csv_to_json.run)[1]
+        state, phases["get_state"] = timed(state_api.get_state, seed=seed)
+        phases["init_rrule_objects"] = timed(time_api.init_rrule_objects, state.rasps, state.time_structure)[1]
+        # algorithms.optimize starts from the prepared State, don't build it twice
+        state_cache.save_prepared_state(state, *state_cache.get_cache_path())
+
+        progress.listen(lambda state, elapsed_time: None, None)
+        try:
+            phases["random_construction"] = timed(perturbation.random_timetable, state)[1]
+        finally:
+            progress.listen(None, None)
+
+        for algo_name in algo_names:
+            algorithm_results[algo_name] = benchmark_algorithm(algo_name, CPU_TIME_SEC, seed)
+
+    return {"num_rasps": len(state.rasps), "num_rooms": len(state.rooms),
+            "random_construction_grade": int(state.grade["totalScore"]),
+            "phases": phases, "algorithms": algorithm_results}
+
+
+"""
+Returns the result of one CPU_TIME_SEC run of algo_name (see benchmark_instance).
+"""
+def benchmark_algorithm(algo_name, CPU_TIME_SEC, seed):
+    best_grade, time_to_best, improvements = None, None, 0
+    start_time = time.time()
+    for snapshot in algorithms.optimize(algo_name, CPU_TIME_SEC, seed):
+        best_grade, time_to_best = snapshot.grade["totalScore"], snapshot.elapsed_time
+        improvements += 1
+    return {"best_grade": best_grade, "time_to_best": time_to_best,
+            "improvements": improvements, "seconds": time.time() - start_time}
+
+
+"""
+Returns a list of regression messages of report compared to baseline (both benchmark reports):
+    1) a phase that got slower by more than tolerance (fraction) and MIN_REGRESSION_SEC
+    2) an algorithm that reached a worse best grade within the same budget
+Only instances, phases and algorithms present in both reports are compared.
+"""
+def compare_reports(report, baseline, tolerance):
+    regressions = []
+    for size, result in report["instances"].items():
+        base_result = baseline["instances"].get(size)
+        if not base_result:
+            continue
+
+        for phase, seconds in result["phases"].items():
+            base_seconds = base_result["phases"].get(phase)
+            if base_seconds is None:
+                continue
+            if seconds > base_seconds * (1 + tolerance) and seconds - base_seconds > MIN_REGRESSION_SEC:
+                regressions.append(f"{size} rasps, {phase}: {base_seconds:.3f}s -> {seconds:.3f}s")
+
+        for algo_name, algo_result in result["algorithms"].items():
+            base_algo_result = base_result["algorithms"].get(algo_name)
+            if not base_algo_result or base_algo_result["best_grade"] is None:
+                continue
+            if algo_result["best_grade"] is None or algo_result["best_grade"] < base_algo_result["best_grade"]:
+                regressions.append(f"{size} rasps, {algo_name}: best grade {base_algo_result['best_grade']} -> {algo_result['best_grade']}")
+    return regressions
+
+
+"""
+Prints one line per phase and algorithm of a benchmark report.
+"""
+def print_report(report):
+    for size, result in report["instances"].items():
+        print(f"\n{size} rasps ({result['num_rasps']} in the State, {result['num_rooms']} rooms)")
+        for phase, seconds in result["phases"].items():
+            print(f"    {phase:<22}{seconds:>10.3f}s")
+        for algo_name, algo_result in result["algorithms"].items():
+            time_to_best = algo_result["time_to_best"]
+            time_to_best = "-" if time_to_best is None else f"{time_to_best:.2f}s"
+            print(f"    {algo_name:<22}{str(algo_result['best_grade']):>10} (best after {time_to_best}, {algo_result['improvements']} improvements)")
+
+
+"""
+Returns (result of function(*args, **kwargs), seconds it took).
+"""
+def timed(function, *args, **kwargs):
+    start_time = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - start_time
+
+
+"""
+Changes the working directory to path for the duration of a with block.
+"""
+@contextlib.contextmanager
+def working_directory(path):
+    old_path = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old_path)
+
+
+"""
+Benchmarks generated instances of every size in sizes, saves the JSON report
+to output_path and compares it to the report in baseline_path (if given).
+Returns the list of regressions.
+"""
+def run(sizes, algo_names, CPU_TIME_SEC, seed, output_path, baseline_path=None, tolerance=0.25):
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "platform": platform.platform(), "seed": seed, "CPU_TIME_SEC": CPU_TIME_SEC, "instances": {}}
+
+    for size in sizes:
+        instance_path = os.path.join(REPO_PATH, "temp_storage", "benchmark", f"instance_{size}_{seed}")
+        print(f"Benchmarking {size} rasps (seed={seed})...")
+        generate_time = build_instance(instance_path, size, seed)
+        result = benchmark_instance(instance_path, algo_names, CPU_TIME_SEC, seed)
+        result["phases"] = {"generate": generate_time, **result["phases"]}
+        report["instances"][str(size)] = result
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print_report(report)
+    print(f"\nReport saved to {output_path}")
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, tolerance)
+        print(f"\n{len(regressions)} regressions against {baseline_path}")
+        for regression in regressions:
+            print(f"    {regression}")
+    return regressions
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000, 10000],
+                    help="numbers of rasps of the generated instances (default: 100 500 2000 10000)")
+parser.add_argument("--algorithms", nargs="+", default=list(algorithms.PORTFOLIO), choices=list(algorithms.PORTFOLIO),
+                    help="algorithms to run on every instance (default: all)")
+parser.add_argument("--budget", type=float, default=10.0,
+                    help="seconds each algorithm runs on each instance (default: 10)")
+parser.add_argument("--seed", type=int, default=0,
+                    help="seed of the instance generator and the algorithms (default: 0)")
+parser.add_argument("--output", default=os.path.join(REPO_PATH, "temp_storage", "benchmark", "report.json"),
+                    help="path of the JSON report (default: temp_storage/benchmark/report.json)")
+parser.add_argument("--compare", default=None,
+                    help="baseline JSON report to compare to, exits with status 1 on regressions")
+parser.add_argument("--tolerance", type=float, default=0.25,
+                    help="allowed slowdown of a phase against the baseline (default: 0.25 = 25%%)")
+args = parser.parse_args()
+
+regressions = run(args.sizes, args.algorithms, args.budget, args.seed, args.output, args.compare, args.tolerance)
+sys.exit(1 if regressions else 0)
@@ -3,36 +3,82 @@ import utilities.print_timetable   as print_timetable
 from utilities.general_utilities import save_timetable_to_file
 from utilities.converter import pickle_to_json, json_to_pickle
 import algorithms as a
-import data_api.state as state_api
+import optimizer.instrumentation as instrumentation
+import optimizer.tracker as tracker
+import data_api.state_cache as state_cache
+import os
 import subprocess
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--portfolio", action="store_true",
+                    help="race all Python algorithms in parallel processes and keep the best timetable")
+parser.add_argument("--decompose", action="store_true",
+                    help="split the rasps into independent clusters, optimize them in parallel processes and merge them")
+parser.add_argument("--seasons", action="store_true",
+                    help="optimize the winter and the summer timetable at the same time in two processes")
+parser.add_argument("--workers", type=int, default=None,
+                    help="number of --portfolio processes (the first N algorithms if N is smaller than their number) "
+                         "or --decompose clusters (default: number of CPU cores, at least one process per --portfolio algorithm)")
+parser.add_argument("--seed", type=int, default=None,
+                    help="seed of the Python optimizers, the same seed gives the same timetable")
+parser.add_argument("--no-cache", action="store_true",
+                    help="rebuild the prepared State (both seasons with --seasons) even if the input didn't change")
+parser.add_argument("--instrument", nargs="?", const="temp_storage/instrumentation.jsonl", default=None, metavar="PATH",
+                    help="count evaluations, skips, accepted moves and taxing time of a Python optimizer run, "
+                         "print a summary and stream JSONL samples to PATH (default: temp_storage/instrumentation.jsonl). "
+                         "Not available with --portfolio, --decompose and --seasons")
+parser.add_argument("--instrument-interval", type=float, default=1.0,
+                    help="seconds between --instrument samples (default: 1)")
+parser.add_argument("--track", nargs="?", const="temp_storage/tracker.json", default=None, metavar="PATH",
+                    help="record the convergence of a Python optimizer run to PATH (.json in the C++ tracker format "
+                         "or .csv, default: temp_storage/tracker.json), also when stopped with Ctrl+C. "
+                         "Not available with --portfolio, --decompose and --seasons")
+parser.add_argument("--track-interval", type=float, default=1.0,
+                    help="seconds between --track samples, improvements are always recorded (default: 1)")
+args = parser.parse_args()
+if args.seasons and (args.portfolio or args.decompose):
+    parser.error("--seasons can't be combined with --portfolio or --decompose")
+if args.workers is not None and args.workers < 1:
+    parser.error("--workers must be at least 1")
 
 print("Loading .csv input from 'database/input/' and 'database/constraints/'")
 input_csv_to_json.run()
+if args.no_cache:
+    state_cache.get_prepared_state(use_cache=False)
+    if args.seasons:
+        state_cache.get_prepared_state(use_cache=False, is_winter=False)
 
 # Choosing programming language
-print("\n> Which programming language to use for optimizer?")
-print("1 = C++\n2 = Python")
 lang = ""
-valid_inputs = ["1", "2"]
-while lang not in valid_inputs:
-    lang = input("Your input: ")
-    if lang not in valid_inputs:
-        print(lang, "is not a valid input.")
-lang = "c++" if lang == "1" else "py"
+if args.portfolio or args.decompose or args.seasons:
+    lang = "py"
+else:
+    print("\n> Which programming language to use for optimizer?")
+    print("1 = C++\n2 = Python")
+    valid_inputs = ["1", "2"]
+    while lang not in valid_inputs:
+        lang = input("Your input: ")
+        if lang not in valid_inputs:
+            print(lang, "is not a valid input.")
+    lang = "c++" if lang == "1" else "py"
 
 # Choosing optimization algorithm
-print("\n> Which optimization algorithm to use?")
-print("1 = Variable Neighborhood Search\n2 = Simulated Annealing")
-print("3 = Repeated Local Search\n4 = Iterated Local Search")
-print("5 = Greedy Randomized Adaptive Search Procedure")
 algo = ""
-valid_inputs = ["1", "2", "3", "4", "5"]
-while algo not in valid_inputs:
-    algo = input("Your input: ")
-    if algo not in valid_inputs:
-        print(algo, "is not a valid input.")
-valid_input_names = {"1": "vns", "2": "sa", "3": "rls", "4": "ils", "5": "grasp"}
-algo = valid_input_names[algo]
+if args.portfolio:
+    algo = "portfolio"
+else:
+    print("\n> Which optimization algorithm to use?")
+    print("1 = Variable Neighborhood Search\n2 = Simulated Annealing")
+    print("3 = Repeated Local Search\n4 = Iterated Local Search")
+    print("5 = Greedy Randomized Adaptive Search Procedure")
+    valid_inputs = ["1", "2", "3", "4", "5"]
+    while algo not in valid_inputs:
+        algo = input("Your input: ")
+        if algo not in valid_inputs:
+            print(algo, "is not a valid input.")
+    valid_input_names = {"1": "vns", "2": "sa", "3": "rls", "4": "ils", "5": "grasp"}
+    algo = valid_input_names[algo]
 
 # Choosing number of seconds for the optimization algorithm
 print("\n> Choose the number of seconds to run the algorithm.")
@@ -47,24 +93,56 @@ CPU_SECONDS = float(CPU_SECONDS)
 # Running the algorithms and saving results
 if lang == "py":
     state = None
-    if algo == "vns":
-        state = a.vns_iterate(CPU_SECONDS)
-    elif algo == "sa":
-        state = a.simulated_annealing_iterate(CPU_SECONDS, 10**4)
-    elif algo == "rls":
-        state = a.repeated_local_search(CPU_SECONDS)
-    elif algo == "ils":
-        state = a.iterated_local_search(CPU_SECONDS)
-    elif algo == "grasp":
-        state = a.grasp_iterate(CPU_SECONDS, 10, 5)
+    in_process = algo != "portfolio" and not args.decompose and not args.seasons
+    if args.instrument and in_process:
+        os.makedirs(os.path.dirname(args.instrument) or ".", exist_ok=True)
+        instrumentation.enable(args.instrument, args.instrument_interval)
 
-    save_timetable_to_file(state, "saved_timetables/state.pickle")
-    print_timetable.run()
-    print("\n> Results saved to timetable.txt.")
+    if args.track and in_process:
+        tracker.start(algo, args.track_interval)
+
+    try:
+        if args.seasons:
+            states = a.seasons_iterate(algo, CPU_SECONDS, args.seed)
+            state  = states["winter"]
+            save_timetable_to_file(states["summer"], "saved_timetables/state_summer.pickle")
+            print_timetable.run(states["summer"], "timetable_summer.txt")
+            print("> Summer results saved to timetable_summer.txt.")
+        elif args.decompose:
+            state = a.decomposed_iterate(algo, CPU_SECONDS, args.workers, args.seed)
+        elif algo == "vns":
+            state = a.vns_iterate(CPU_SECONDS, args.seed)
+        elif algo == "sa":
+            state = a.simulated_annealing_iterate(CPU_SECONDS, 10**4, args.seed)
+        elif algo == "rls":
+            state = a.repeated_local_search(CPU_SECONDS, args.seed)
+        elif algo == "ils":
+            state = a.iterated_local_search(CPU_SECONDS, args.seed)
+        elif algo == "grasp":
+            state = a.grasp_iterate(CPU_SECONDS, 10, 5, args.seed)
+        elif algo == "portfolio":
+            state = a.portfolio_iterate(CPU_SECONDS, args.workers, args.seed)
+    finally:
+        convergence = tracker.stop()
+        if convergence:
+            tracker.save(convergence, args.track)
+            print(f"> Convergence trace saved to {args.track}.")
+
+    summary = instrumentation.disable()
+    if summary:
+        instrumentation.print_summary(summary)
+        print(f"> Instrumentation samples saved to {args.instrument}.")
+
+    if state is None:
+        print("\n> No timetable was found, nothing was saved.")
+    else:
+        save_timetable_to_file(state, "saved_timetables/state.pickle")
+        print_timetable.run()
+        print("\n> Results saved to timetable.txt.")
 
 elif lang == "c++":
     # Convert .csv input to .pickle State
-    state = state_api.get_state()
+    state = state_cache.get_prepared_state()
     save_timetable_to_file(state, "saved_timetables/state.pickle")
 
     # Convert .pickle State to .json State
@@ -66,10 +66,11 @@ def get_rooms_dict():
 
 
 """
-Returns an updated version of a room dictionary where only rooms with some free space are kept.
+Returns an updated version of a room dictionary where only rooms with some free space are kept
+(rooms_index has only rooms that got a rooms_occupied matrix).
 """
-def update_rooms(rooms, rooms_occupied):
-    return {room.id:room for room in rooms.values() if room.id in rooms_occupied}
+def update_rooms(rooms, rooms_index):
+    return {room.id:room for room in rooms.values() if room.id in rooms_index}
 
 
 """
@@ -1,12 +1,17 @@
+import copyreg
+import numpy as np
 import data_api.classrooms as room_api
 import data_api.professors as prof_api
 import data_api.semesters  as seme_api
-from utilities.my_types import InitialConstraints, MutableConstraints
+from multiprocessing.shared_memory import SharedMemory
+from utilities.my_types import InitialConstraints, MutableConstraints, ConstraintsIndex
 from collections import defaultdict
 
 """
 Returns InitialConstraints object that contains initial constraints of:
-rooms, professors, and semesters.
+rooms, professors, semesters, and rasp groups.
+Each family is one (num_entities, NUM_WEEKS, NUM_DAYS, NUM_HOURS) array,
+rows are found with constraints.index (see pack_constraints).
 This object is not meant to be mutated.
 """
 def get_initial_constraints(time_structure, rooms, rasps):
@@ -16,23 +21,132 @@ def get_initial_constraints(time_structure, rooms, rasps):
     rooms_occupied   = room_api.get_rooms_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rooms)
     profs_occupied   = prof_api.get_professors_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rasps)
     sems_occupied, optionals_occupied, sems_collisions = seme_api.get_sems_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rasps)
+    groups_occupied, subjects_occupied = get_groups_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rasps)
 
-    return InitialConstraints(rooms_occupied, profs_occupied, sems_occupied, optionals_occupied, sems_collisions)
+    return pack_constraints(InitialConstraints, [rooms_occupied, profs_occupied, sems_occupied, optionals_occupied,
+                                                 sems_collisions, groups_occupied, subjects_occupied])
 
 
 """
 Returns MutableConstraints object that contains initial constraints of:
-rooms, professors, and semesters.
+rooms, professors, semesters, and rasp groups.
+The whole packed array is copied at once, index is shared with initial_constraints.
 This object is meant to be mutated.
 """
 def get_mutable_constraints(initial_constraints: InitialConstraints):
-    rooms_occupied     = {k:v.copy() for k,v in initial_constraints.rooms_occupied.items()}
-    profs_occupied     = {k:v.copy() for k,v in initial_constraints.profs_occupied.items()}
-    sems_occupied      = {k:v.copy() for k,v in initial_constraints.sems_occupied.items()}
-    optionals_occupied = {k:v.copy() for k,v in initial_constraints.optionals_occupied.items()}
-    sems_collisions    = {k:v.copy() for k,v in initial_constraints.sems_collisions.items()}
+    packed = initial_constraints.packed.copy()
+    return unpack_constraints(MutableConstraints, packed, initial_constraints.index)
 
-    return MutableConstraints(rooms_occupied, profs_occupied, sems_occupied, optionals_occupied, sems_collisions)
+
+"""
+Resets state.mutable_constraints to initial constraints with one copy of the packed array.
+The family arrays stay the same objects (views into mutable_constraints.packed).
+"""
+def reset_mutable_constraints(state):
+    if state.mutable_constraints is None:
+        state.mutable_constraints = get_mutable_constraints(state.initial_constraints)
+    else:
+        np.copyto(state.mutable_constraints.packed, state.initial_constraints.packed)
+
+
+# ConstraintsIndex field of each constraints family (in field order), sems_occupied and sems_collisions share rows
+FAMILY_INDEX = ("rooms", "profs", "sems", "optionals", "sems", "groups", "subjects")
+
+
+"""
+Returns constraints_type (InitialConstraints or MutableConstraints) built from
+families (list of {key : matrix3D} dicts, in field order):
+    1) index -> ConstraintsIndex of {key : row} dicts (keys are sorted so rows don't
+       depend on the order the dicts were built in)
+    2) packed -> all matrices copied into one contiguous array of shape
+       (num_matrices, NUM_WEEKS, NUM_DAYS, NUM_HOURS)
+    3) families -> consecutive slices of packed, e.g.
+       constraints.rooms_occupied[constraints.index.rooms[room_id]] is the room's matrix3D
+"""
+def pack_constraints(constraints_type, families):
+    family_keys = dict(zip(FAMILY_INDEX, families))
+    index = ConstraintsIndex(*[{key : row for row, key in enumerate(sorted(family_keys[name], key=str))}
+                               for name in ConstraintsIndex._fields])
+
+    shape = next(iter(families[0].values())).shape
+    packed = np.empty((sum(len(family) for family in families),) + shape, dtype=np.uint8)
+    row = 0
+    for name, family in zip(FAMILY_INDEX, families):
+        for key in getattr(index, name):
+            packed[row] = family[key]
+            row += 1
+    return unpack_constraints(constraints_type, packed, index)
+
+
+"""
+Returns constraints_type whose families are consecutive slices of the packed array
+(sizes are taken from index).
+"""
+def unpack_constraints(constraints_type, packed, index):
+    families, start = [], 0
+    for name in FAMILY_INDEX:
+        end = start + len(getattr(index, name))
+        families.append(packed[start:end])
+        start = end
+    return constraints_type(*families, index, packed)
+
+
+"""
+Constraints are pickled (and deep copied) as the packed array and index only,
+so families are views into one packed array again after loading.
+"""
+def reduce_constraints(constraints):
+    return (unpack_constraints, (type(constraints), constraints.packed, constraints.index))
+
+copyreg.pickle(InitialConstraints, reduce_constraints)
+copyreg.pickle(MutableConstraints, reduce_constraints)
+
+
+"""
+Copies the packed initial constraints into a new multiprocessing.shared_memory block.
+Returns the shared_memory; pass its name, packed.shape and index to attach_initial_constraints
+in other processes. The caller closes and unlinks shared_memory when they are done.
+"""
+def share_initial_constraints(initial_constraints):
+    packed = initial_constraints.packed
+    shared_memory = SharedMemory(create=True, size=packed.nbytes)
+    shared_packed = np.ndarray(packed.shape, dtype=packed.dtype, buffer=shared_memory.buf)
+    shared_packed[:] = packed
+    del shared_packed
+    return shared_memory
+
+
+"""
+Returns (shared_memory, InitialConstraints) whose families are read-only views into
+the shared memory block made by share_initial_constraints (no copies are made).
+shared_memory has to stay referenced as long as the InitialConstraints is used.
+"""
+def attach_initial_constraints(name, shape, index):
+    shared_memory = SharedMemory(name=name)
+    packed = np.ndarray(shape, dtype=np.uint8, buffer=shared_memory.buf)
+    packed.flags.writeable = False
+    return shared_memory, unpack_constraints(InitialConstraints, packed, index)
+
+
+"""
+Returns two dictionaries:
+1) groups_occupied[type_key]     = np.zeros[NUM_WEEKS][NUM_DAYS][NUM_HOURS]
+2) subjects_occupied[subject_id] = np.zeros[NUM_WEEKS][NUM_DAYS][NUM_HOURS]
+
+groups_occupied counts how many rasps of a rasp type (subject_id + type) are taxed
+at each (week, day, hour). subjects_occupied does the same for all rasps of a subject.
+They replace rebuilding sets of group dates from rasp_rrules (see in_own_groups_dates).
+"""
+def get_groups_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rasps):
+    groups_occupied, subjects_occupied = {}, {}
+    for rasp in rasps:
+        type_key = str(rasp.subject_id) + str(rasp.type)
+        if type_key not in groups_occupied:
+            groups_occupied[type_key] = np.zeros((NUM_WEEKS, NUM_DAYS, NUM_HOURS), dtype=np.uint8)
+        if rasp.subject_id not in subjects_occupied:
+            subjects_occupied[rasp.subject_id] = np.zeros((NUM_WEEKS, NUM_DAYS, NUM_HOURS), dtype=np.uint8)
+
+    return groups_occupied, subjects_occupied
 
 
 """
@@ -110,3 +224,30 @@ def get_other_groups_all_dates(state, rasp):
                 other_all_dates.add((week, day, hour))
 
     return other_all_dates
+
+
+"""
+Returns a boolean array that is True where all_dates_idx (flat date indices) is taken by
+another group of the given rasp's type. Same as testing membership in
+get_own_groups_all_dates, but reads the groups_occupied count matrix.
+Assumes that the rasp itself is not taxed at the moment.
+"""
+def in_own_groups_dates(state, rasp, all_dates_idx):
+    mutable_constraints = state.mutable_constraints
+    own_type = str(rasp.subject_id) + str(rasp.type)
+    groups_occupied = mutable_constraints.groups_occupied[mutable_constraints.index.groups[own_type]].ravel()
+    return groups_occupied[all_dates_idx] > 0
+
+
+"""
+Returns a boolean array that is True where all_dates_idx (flat date indices) is taken by
+a group of other types of the given rasp's subject. Same as testing membership in
+get_other_groups_all_dates, but reads the subjects_occupied and groups_occupied count matrices.
+"""
+def in_other_groups_dates(state, rasp, all_dates_idx):
+    mutable_constraints = state.mutable_constraints
+    index = mutable_constraints.index
+    own_type = str(rasp.subject_id) + str(rasp.type)
+    subject_occupied = mutable_constraints.subjects_occupied[index.subjects[rasp.subject_id]].ravel()
+    groups_occupied  = mutable_constraints.groups_occupied[index.groups[own_type]].ravel()
+    return subject_occupied[all_dates_idx] > groups_occupied[all_dates_idx]
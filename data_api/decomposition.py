@@ -0,0 +1,148 @@
+import numpy as np
+import data_api.state         as state_api
+import data_api.constraints   as cons_api
+import optimizer.rasp_slots   as rasp_slots
+from utilities.my_types import State, Solution, SlotDomain
+
+"""
+Returns connected components of the rasp interaction graph of a State as lists of rasps
+(in state.rasps order), largest first. Two rasps interact if they share:
+    1) a professor
+    2) a semester (mandatory or optional)
+    3) a subject (groups of a subject are taxed together, see tax_groups)
+    4) a fixed room (fix_at_room_id)
+Rooms that all rasps can use are not edges, they are split between components
+later (see partition_rooms).
+"""
+def get_components(state):
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for rasp in state.rasps:
+        nodes = [("prof", rasp.professor_id), ("subject", rasp.subject_id)]
+        nodes += [("sem", sem_id) for sem_id in rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids]
+        if rasp.fix_at_room_id:
+            nodes.append(("room", rasp.fix_at_room_id))
+        root = find(("rasp", rasp.id))
+        for node in nodes:
+            parent[find(node)] = root
+
+    components = {}
+    for rasp in state.rasps:
+        components.setdefault(find(("rasp", rasp.id)), []).append(rasp)
+    return sorted(components.values(), key=len, reverse=True)
+
+
+"""
+Packs components into at most num_clusters clusters of similar size
+(largest component first, into the cluster with the fewest rasps).
+Returns a list of clusters, each a list of rasps in state.rasps order.
+"""
+def get_clusters(state, components, num_clusters):
+    clusters = [[] for _ in range(min(num_clusters, len(components)))]
+    for component in components:
+        min(clusters, key=len).extend(component)
+
+    order = {rasp.id : i for i, rasp in enumerate(state.rasps)}
+    return [sorted(cluster, key=lambda rasp: order[rasp.id]) for cluster in clusters]
+
+
+"""
+Returns the number of hours a rasp occupies in the timetable (its all_dates path length).
+"""
+def get_rasp_hours(state, rasp):
+    domain = state.slot_domains[rasp.id]
+    if not len(domain.slots):
+        return 0
+    return len(rasp_slots.get_all_dates_index(state, rasp, rasp_slots.get_domain_slot(domain, 0)))
+
+
+"""
+Splits the rooms of a State between clusters (the coordination step of shared rooms).
+Returns a list of room id sets, one per cluster:
+    1) fixed rooms (fix_at_room_id) go to the cluster of their rasps
+    2) computer rooms, largest first, go to the cluster with the largest unmet
+       share of hours of rasps that need computers
+    3) other rooms, largest first, go to the cluster with the largest unmet
+       share of all its hours
+Supply of a room is the number of its hours that are free in the initial constraints.
+"""
+def partition_rooms(state, clusters):
+    initial  = state.initial_constraints
+    index    = initial.index.rooms
+    supply   = {room_id : int((initial.rooms_occupied[row] == 0).sum()) for room_id, row in index.items()}
+    hours    = [sum(get_rasp_hours(state, rasp) for rasp in cluster) for cluster in clusters]
+    pc_hours = [sum(get_rasp_hours(state, rasp) for rasp in cluster if rasp.needs_computers) for cluster in clusters]
+
+    room_sets = [set() for _ in clusters]
+    for i, cluster in enumerate(clusters):
+        room_sets[i].update(rasp.fix_at_room_id for rasp in cluster if rasp.fix_at_room_id in index)
+    assigned = set().union(*room_sets)
+
+    def unmet(demand, supplied):
+        return (demand - supplied) / demand if demand else float("-inf")
+
+    rooms = sorted((room for room_id, room in state.rooms.items() if room_id in index and room_id not in assigned),
+                   key=lambda room: room.capacity, reverse=True)
+    computer_rooms = [room for room in rooms if room.has_computers]
+    other_rooms    = [room for room in rooms if not room.has_computers]
+
+    for room in computer_rooms:
+        pc_supply = [sum(supply[room_id] for room_id in room_set if state.rooms[room_id].has_computers) for room_set in room_sets]
+        i = max(range(len(clusters)), key=lambda i: unmet(pc_hours[i], pc_supply[i]))
+        if pc_hours[i] <= pc_supply[i]:
+            other_rooms.append(room)
+        else:
+            room_sets[i].add(room.id)
+
+    other_rooms.sort(key=lambda room: room.capacity, reverse=True)
+    for room in other_rooms:
+        all_supply = [sum(supply[room_id] for room_id in room_set) for room_set in room_sets]
+        i = max(range(len(clusters)), key=lambda i: unmet(hours[i], all_supply[i]))
+        room_sets[i].add(room.id)
+    return room_sets
+
+
+"""
+Returns a new State of rasps of one cluster (a list of rasp ids) placed only in room_ids.
+Static data (time structure, rooms, initial constraints, rrule objects) is shared with state,
+slot domains are limited to room_ids (rasps whose domain has no slot in room_ids keep
+their whole domain, they are placed by the coordination step).
+"""
+def get_sub_state(state, rasp_ids, room_ids):
+    rasp_ids  = set(rasp_ids)
+    rasps     = [rasp for rasp in state.rasps if rasp.id in rasp_ids]
+    room_rows = [row for room_id, row in state.initial_constraints.index.rooms.items() if room_id in room_ids]
+
+    slot_domains = {}
+    for rasp in rasps:
+        domain = state.slot_domains[rasp.id]
+        in_rooms = np.isin(domain.slots[:, 0], room_rows)
+        slot_domains[rasp.id] = SlotDomain(domain.room_ids, domain.positions, domain.slots[in_rooms]) if in_rooms.any() else domain
+
+    sub_state = State(state.is_winter, state.semesters, state.time_structure, rasps, state.rooms,
+                      state.students_per_rasp, state.initial_constraints,
+                      cons_api.get_type_rasps(rasps), cons_api.get_subject_types(rasps),
+                      None, None, None, state.rasp_rrules, state.rrule_table, state.rrule_dates,
+                      None, state.rng, slot_domains)
+    state_api.clear_mutable(sub_state)
+    return sub_state
+
+
+"""
+Returns one Solution of state built from Solutions of sub-States (see get_sub_state):
+sub_solutions is a list of (rasp ids of the sub-State in state.rasps order, Solution).
+Rasps without a sub-Solution are not placed. The grade is computed by solution_api.restore.
+"""
+def merge_solutions(state, sub_solutions):
+    slots = np.full((len(state.rasps), 4), -1, dtype=np.int16)
+    rows  = {rasp.id : i for i, rasp in enumerate(state.rasps)}
+    for rasp_ids, solution in sub_solutions:
+        slots[[rows[rasp_id] for rasp_id in rasp_ids]] = solution.slots
+    return Solution(slots, None)
@@ -0,0 +1,53 @@
+import numpy as np
+import data_api.constraints as cons_api
+from utilities.my_types import OccupancyBits
+
+# Hours of one day are bits of one np.uint64 word
+MAX_BITSET_HOURS = 64
+
+"""
+Returns np.uint64 masks of shape (..., NUM_WEEKS, NUM_DAYS) of a (..., NUM_WEEKS, NUM_DAYS, NUM_HOURS)
+count matrix. Bit h of a mask is set when matrix[..., h] >= min_count.
+"""
+def hours_to_masks(matrix, min_count=1):
+    NUM_HOURS = matrix.shape[-1]
+    if NUM_HOURS > MAX_BITSET_HOURS:
+        raise ValueError(f"Bitset occupancy supports at most {MAX_BITSET_HOURS} hours per day, got {NUM_HOURS}.")
+
+    hour_bits = np.left_shift(np.uint64(1), np.arange(NUM_HOURS, dtype=np.uint64))
+    return np.bitwise_or.reduce(np.where(matrix >= min_count, hour_bits, np.uint64(0)), axis=-1)
+
+
+"""
+Returns OccupancyBits snapshot of constraints (InitialConstraints or MutableConstraints):
+    1) occupied -> masks of hours with count >= 1 (free/taken test)
+    2) overflow -> masks of hours with count >= 2 (collisions)
+Both are of the same type and index as constraints, with (NUM_WEEKS, NUM_DAYS) masks
+instead of 3D matrices, e.g. bits.occupied.rooms_occupied[index.rooms[room_id]].
+Exact multiplicities stay in constraints. The snapshot isn't updated
+by taxing, so it's meant for read-only queries of a fixed timetable.
+"""
+def get_occupancy_bits(constraints):
+    packed, index = constraints.packed, constraints.index
+    return OccupancyBits(cons_api.unpack_constraints(type(constraints), hours_to_masks(packed, 1), index),
+                         cons_api.unpack_constraints(type(constraints), hours_to_masks(packed, 2), index))
+
+
+"""
+Returns (weeks, days, masks) of a rasp starting at each (week, day, hour) of all_dates
+and lasting duration hours. masks[i] has bits hour..hour+duration-1 set.
+"""
+def dates_to_masks(all_dates, duration):
+    dates = np.array(all_dates, dtype=np.int64).reshape(-1, 3)
+    weeks, days, hours = dates[:, 0], dates[:, 1], dates[:, 2].astype(np.uint64)
+    masks = np.left_shift(np.uint64((1 << duration) - 1), hours)
+    return weeks, days, masks
+
+
+"""
+Returns True if any hour of the all_dates path (starting hours lasting duration hours)
+is set in masks (one entity's (NUM_WEEKS, NUM_DAYS) masks). One AND per date.
+"""
+def any_collisions_in_masks(all_dates, duration, masks):
+    weeks, days, path_masks = dates_to_masks(all_dates, duration)
+    return bool(np.any(masks[weeks, days] & path_masks))
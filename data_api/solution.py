@@ -0,0 +1,56 @@
+import numpy as np
+import data_api.state              as state_api
+import optimizer.tax_tool          as tax_tool
+import optimizer.rasp_slots        as rasp_slots
+import optimizer.conflict_registry as conflict_registry
+from utilities.my_types import Slot, Solution
+
+"""
+Returns a Solution of state's timetable: one small integer row per rasp
+(in state.rasps order) and a copy of the grade. Rooms are stored as their
+rows in initial_constraints.index.rooms. O(number of rasps).
+"""
+def snapshot(state):
+    rooms     = state.initial_constraints.index.rooms
+    timetable = state.timetable
+    slots = [(rooms[slot.room_id], slot.week, slot.day, slot.hour) if slot is not None else (-1, -1, -1, -1)
+             for slot in (timetable.get(rasp) for rasp in state.rasps)]
+    return Solution(np.array(slots, dtype=np.int16).reshape(-1, 4), state.grade.copy())
+
+
+"""
+Puts the timetable of solution back into state (a State of the same input).
+Mutable constraints are rebuilt by taxing all rasps at once and the conflict
+registry is rebuilt with one scan at the end.
+"""
+def restore(state, solution):
+    room_ids = get_room_ids(state)
+    state_api.clear_mutable(state)
+
+    timetable = state.timetable
+    for rasp, (room_row, week, day, hour) in zip(state.rasps, solution.slots.tolist()):
+        if room_row < 0:
+            continue
+        slot = Slot(room_ids[room_row], week, day, hour)
+        rasp_slots.update_rasp_rrules(state, slot, rasp)
+        tax_tool.tax_all_constraints(state, slot, rasp)
+        timetable[rasp] = slot
+    state.conflict_registry = conflict_registry.get_conflict_registry(state)
+
+
+"""
+Returns True if state's timetable is the timetable of solution.
+"""
+def is_current(state, solution):
+    return np.array_equal(snapshot(state).slots, solution.slots)
+
+
+"""
+Returns room ids of a State by their rows in initial_constraints.index.rooms.
+"""
+def get_room_ids(state):
+    rooms    = state.initial_constraints.index.rooms
+    room_ids = [None] * len(rooms)
+    for room_id, row in rooms.items():
+        room_ids[row] = room_id
+    return room_ids
@@ -1,39 +1,55 @@
-import data_api.classrooms     as room_api
-import data_api.rasps          as rasp_api
-import data_api.semesters      as seme_api
-import data_api.time_structure as time_api
-import data_api.constraints    as cons_api
-import optimizer.grade_tool    as grade_tool
+import random
+import data_api.classrooms         as room_api
+import data_api.rasps              as rasp_api
+import data_api.semesters          as seme_api
+import data_api.time_structure     as time_api
+import data_api.constraints        as cons_api
+import optimizer.grade_tool        as grade_tool
+import optimizer.rasp_slots        as rasp_slots
+import optimizer.conflict_registry as conflict_registry
 from utilities.my_types import State
 
-def get_state():
-    is_winter = True
+"""
+Returns a fresh State built from temp_storage/ input.
+initial_constraints can be given to reuse already built ones (e.g. attached
+from shared memory with cons_api.attach_initial_constraints).
+seed initializes state.rng, the random stream used by all optimizers
+(None seeds it from the OS, same as the random module).
+is_winter chooses the season: rasps and semesters of winter or summer.
+"""
+def get_state(initial_constraints=None, seed=None, is_winter=True):
     time_structure           = time_api.get_time_structure()
     semesters                = seme_api.get_winter_semesters_dict() if is_winter else seme_api.get_summer_semesters_dict()
     rasps                    = rasp_api.get_rasps_by_season(is_winter)
     students_per_rasp        = seme_api.get_students_per_rasp_estimate(rasps)
     rooms                    = room_api.get_rooms_dict()
-    initial_constraints      = cons_api.get_initial_constraints(time_structure, rooms, rasps)
-    rooms                    = room_api.update_rooms(rooms, initial_constraints.rooms_occupied)
+    if initial_constraints is None:
+        initial_constraints  = cons_api.get_initial_constraints(time_structure, rooms, rasps)
+    rooms                    = room_api.update_rooms(rooms, initial_constraints.index.rooms)
 
     groups = cons_api.get_type_rasps(rasps)
     subject_types = cons_api.get_subject_types(rasps)
+    rasp_rrules, rrule_table, rrule_dates = time_api.init_rrule_objects(rasps, time_structure)
 
     state = State(is_winter, semesters, time_structure, rasps, rooms, students_per_rasp,
                   initial_constraints, groups, subject_types,
-                  None, None, None, None, None)
+                  None, None, None, rasp_rrules, rrule_table, rrule_dates, None, random.Random(seed), None)
+    state.slot_domains = rasp_slots.get_slot_domains(state)
 
     clear_mutable(state)
     return state
 
 
+"""
+Resets the timetable, grade, mutable constraints, rasp_rrules paths and conflict registry of a State.
+rrule_table and rrule_dates are kept because they don't depend on the timetable.
+"""
 def clear_mutable(state):
     rasps = state.rasps
-    initial_constraints = state.initial_constraints
-    time_structure = state.time_structure
-
-    state.grade                          = grade_tool.init_grade(rasps)
-    state.timetable                      = {}
-    state.mutable_constraints            = cons_api.get_mutable_constraints(initial_constraints)
-    state.rasp_rrules, state.rrule_table = time_api.init_rrule_objects(rasps, time_structure)
 
+    state.grade               = grade_tool.init_grade(rasps)
+    state.timetable           = {}
+    cons_api.reset_mutable_constraints(state)
+    for rasp in rasps:
+        rasp_slots.clear_rasp_rrules(state, rasp)
+    state.conflict_registry = conflict_registry.get_conflict_registry(state)
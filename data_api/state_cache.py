@@ -0,0 +1,106 @@
+import os
+import pickle
+import random
+import hashlib
+import data_api.state as state_api
+from utilities.my_types import State
+from utilities.general_utilities import load_settings
+
+# Bump when get_state builds a different State from the same input
+CACHE_VERSION = 5
+
+"""
+Returns a hex key of the optimizer input: settings.json, every .csv file
+it points to, CACHE_VERSION and State fields.
+"""
+def get_input_hash():
+    settings = load_settings()
+    digest   = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION} {State.__fields__}".encode())
+    with open("settings.json", "rb") as f:
+        digest.update(f.read())
+
+    csv_paths = sorted(path for key, path in settings.items() if key.endswith("_csv") and path)
+    for path in csv_paths:
+        digest.update(path.encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+"""
+Returns a fresh State (same as state_api.get_state) of a season for the current input.
+The State is loaded from temp_storage/state_cache/<input hash>_<season>.pickle if the
+input didn't change since it was built, otherwise it's built and cached
+(cache files of older inputs are removed). Only state.rng isn't cached, it is seeded with seed.
+use_cache=False always builds the State (and refreshes the cache).
+initial_constraints can be given to use them instead of the cached ones (e.g. attached
+from shared memory with cons_api.attach_initial_constraints), the cached ones are then
+skipped without being unpickled (see load_prepared_state).
+"""
+def get_prepared_state(seed=None, use_cache=True, is_winter=True, initial_constraints=None):
+    cache_dir, cache_path = get_cache_path(is_winter)
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            state = load_prepared_state(cache_path, initial_constraints)
+            state.rng = random.Random(seed)
+            return state
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+            print(f"Ignoring unreadable state cache {cache_path}")
+
+    state = state_api.get_state(initial_constraints=initial_constraints, seed=seed, is_winter=is_winter)
+    save_prepared_state(state, cache_dir, cache_path)
+    return state
+
+
+"""
+Returns (cache_dir, cache_path) of the prepared State of a season of the current input.
+"""
+def get_cache_path(is_winter=True):
+    cache_dir = load_settings()["path_state_cache"]
+    season    = "winter" if is_winter else "summer"
+    return cache_dir, os.path.join(cache_dir, f"{get_input_hash()}_{season}.pickle")
+
+
+"""
+Returns the State saved to cache_path by save_prepared_state. Given initial_constraints
+replace the cached ones, which are then skipped (seeked over) instead of unpickled.
+"""
+def load_prepared_state(cache_path, initial_constraints=None):
+    with open(cache_path, "rb") as f:
+        constraints_size = pickle.load(f)
+        if initial_constraints is None:
+            initial_constraints = pickle.load(f)
+        else:
+            f.seek(constraints_size, os.SEEK_CUR)
+        state = pickle.load(f)
+    state.initial_constraints = initial_constraints
+    return state
+
+
+"""
+Atomically writes state to cache_path and removes cached States of other inputs
+in cache_dir (the other season of the same input is kept).
+The file holds the size of the pickled initial constraints, the pickled initial constraints
+and the pickled State without them (see load_prepared_state).
+"""
+def save_prepared_state(state, cache_dir, cache_path):
+    os.makedirs(cache_dir, exist_ok=True)
+    input_hash = os.path.basename(cache_path).split("_")[0]
+    for name in os.listdir(cache_dir):
+        if name.endswith(".pickle") and name.split("_")[0] != input_hash:
+            os.remove(os.path.join(cache_dir, name))
+
+    initial_constraints = state.initial_constraints
+    constraints         = pickle.dumps(initial_constraints, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path           = cache_path + f".{os.getpid()}.tmp"
+    state.initial_constraints = None
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump(len(constraints), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(constraints)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        state.initial_constraints = initial_constraints
+    os.replace(temp_path, cache_path)
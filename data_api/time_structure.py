@@ -1,4 +1,5 @@
 import json
+import numpy as np
 from dateutil.rrule import rrulestr, rrule, DAILY
 from datetime import datetime, timedelta
 from utilities.my_types import Timeblock, TimeStructure
@@ -129,21 +130,41 @@ Converts datetime to matching index triplet (week, day, hour).
 e.g. datetime(2021, 10, 4, 8, 0) might return (0,0,0)
 """
 def date_to_index(date, time_structure):
+    return dates_to_index([date], time_structure)[0]
+
+
+"""
+Converts datetimes to matching index triplets (week, day, hour) with integer arithmetic:
+    week = whole weeks since START_SEMESTER_DATE
+    day  = weekday (0 is Monday)
+    hour = index of the timeblock starting at date's minute of the day (-1 for 00:00)
+Raises KeyError for a time that isn't a start of some timeblock (same as hour_to_index).
+"""
+def dates_to_index(dates, time_structure):
     START_SEMESTER_DATE = time_structure.START_SEMESTER_DATE
-    hour_to_index = time_structure.hour_to_index
-    week = weeks_between(START_SEMESTER_DATE, date) - 1 #-1 because weeks_between is 1-indexed
+    minute_to_index = {int(hourmin[:2]) * 60 + int(hourmin[3:5]) : index
+                       for hourmin, index in time_structure.hour_to_index.items()}
+    minute_to_index[0] = -1
 
-    day = date.weekday() # in Python 0 is Monday, 6 is Sunday
-    hr, mins = str(date.hour), str(date.minute)
-    hr = hr if len(hr) == 2 else "0" + hr
-    mins = mins if len(mins) == 2 else "0" + mins
-    hourmin = hr + ":" + mins
+    return tuple(((date - START_SEMESTER_DATE).days // 7,
+                  date.weekday(),
+                  minute_to_index[date.hour * 60 + date.minute])
+                 for date in dates)
 
-    hour = -1
-    if hourmin != "00:00":
-        hour = hour_to_index[hourmin]
 
-    return week,day,hour
+"""
+Converts a list of index triplets (week, day, hour) to a flat np.intp array.
+Each element is a position in a raveled (NUM_WEEKS, NUM_DAYS, NUM_HOURS) matrix
+so that a whole all_dates path can be read from a matrix with one fancy-index gather.
+"""
+def dates_to_flat_index(all_dates, time_structure):
+    NUM_DAYS  = time_structure.NUM_DAYS
+    NUM_HOURS = time_structure.NUM_HOURS
+    if not all_dates:
+        return np.empty(0, dtype=np.intp)
+
+    dates = np.array(all_dates, dtype=np.intp)
+    return (dates[:, 0] * NUM_DAYS + dates[:, 1]) * NUM_HOURS + dates[:, 2]
 
 
 """
@@ -184,10 +205,14 @@ def get_rrule_dates(rasp_rrule, NEW_DTSTART, NEW_UNTIL, time_structure):
     rasp_rrule = rasp_rrule.replace(old_until_str, new_until_str)
     rasp_dates = rrulestr(rasp_rrule)
 
-    rasp_dates = tuple(date_to_index(date, time_structure) for date in rasp_dates)
+    rasp_dates = dates_to_index(rasp_dates, time_structure)
     return rasp_dates
 
 
+"""
+Returns rrule_table_element[(week, day)] = all_dates (list of (week, day)) of an RRULE
+for every DTSTART in dtstart_weekdays.
+"""
 def get_rrule_table_element(rrule_str, dtstart_weekdays, until, time_structure):
     rrule_table_element = {}
     for dtstart in dtstart_weekdays:
@@ -198,36 +223,102 @@ def get_rrule_table_element(rrule_str, dtstart_weekdays, until, time_structure):
     return rrule_table_element
 
 """
-Returns a dictionary rasp_rrules[rasp.id] = rrule_obj and also list rrule_space.
-rrule_obj consists of keys ["DTSTART", "UNTIL", "FREQ", "all_dates",
+Returns a dictionary rrule_dates[(rrule_table_index, week, day, hour, duration)] =
+(all_dates, all_dates_idx) that holds every all_dates path a rasp can take.
+(week, day) is a key of rrule_table[rrule_table_index], hour is the starting hour and
+duration is the duration of some rasp that uses that rrule_table_index.
+all_dates is a tuple of (week, day, hour) triplets and all_dates_idx is the read-only
+dates_to_flat_index form of it. Both are shared by all rasps placed on the same path.
+"""
+def get_rrule_dates_table(rasps, rasp_rrules, rrule_table, time_structure):
+    NUM_HOURS = time_structure.NUM_HOURS
+
+    durations = {}
+    for rasp in rasps:
+        index = rasp_rrules[rasp.id]["rrule_table_index"]
+        durations.setdefault(index, set()).add(rasp.duration)
+
+    triplets, rrule_dates = {}, {}
+    for index, index_durations in durations.items():
+        for (dt_week, dt_day), week_days in rrule_table[index].items():
+            for duration in index_durations:
+                for start_hour in range(NUM_HOURS - duration + 1):
+                    all_dates = tuple(triplets.setdefault((week, day, hour), (week, day, hour))
+                                      for week, day in week_days
+                                      for hour in range(start_hour, start_hour + duration))
+                    all_dates_idx = dates_to_flat_index(all_dates, time_structure)
+                    all_dates_idx.flags.writeable = False
+                    rrule_dates[(index, dt_week, dt_day, start_hour, duration)] = (all_dates, all_dates_idx)
+
+    return rrule_dates
+
+
+"""
+Returns a hashable canonical key of an RRULE string: stripped lines in sorted order
+with RRULE parameters in sorted order. Equal keys expand to the same dates.
+"""
+def get_rrule_key(rrule_str):
+    lines = []
+    for line in rrule_str.split():
+        name, value = line.split(':', 1)
+        if name == "RRULE":
+            value = ";".join(sorted(value.split(";")))
+        lines.append(name.upper() + ":" + value)
+    return "\n".join(sorted(lines))
+
+
+"""
+Returns a hashable key of rrule_table_element, equal keys mean equal elements.
+"""
+def get_rrule_table_element_key(rrule_table_element):
+    return frozenset((key, tuple(all_dates)) for key, all_dates in rrule_table_element.items())
+
+
+"""
+Returns a dictionary rasp_rrules[rasp.id] = rrule_obj, list rrule_space and
+dictionary rrule_dates (see get_rrule_dates_table).
+rrule_obj consists of keys ["DTSTART", "UNTIL", "FREQ", "all_dates", "all_dates_idx",
                             "dtstart_weekdays", "rrule_table_index"]
+all_dates_idx is all_dates in dates_to_flat_index form.
 
 rrule_space holds a list of "rrule_table_element" dictionaries.
 rrule_table_element[(week, day)] = all_dates
 (week, day) is possible DTSTART of a rasp and all_dates is a list of all rrule
 dates starting from (week, day).
-The idea is to memoize all of the possible "all_dates" of each rasp in "rrule_space".
+The idea is to memoize all of the possible "all_dates" of each rasp in "rrule_space"
+and "rrule_dates" so that they are computed only once per State.
+Rasps with the same (get_rrule_key, random_dtstart_weekday) share one RRULE expansion
+and equal rrule_table_elements are deduplicated by get_rrule_table_element_key.
 """
 def init_rrule_objects(rasps, time_structure):
     NUM_DAYS = time_structure.NUM_DAYS
 
     rasp_rrules, rrule_table = {}, []
+    expanded_rrules, table_indices = {}, {}
     freqs = {0:"YEARLY", 1:"MONTHLY", 2:"WEEKLY", 3:"DAILY"}
     for rasp in rasps:
-        rrule_obj = rrulestr(rasp.rrule)
-        dtstart = rrule_obj._dtstart
-        until = rrule_obj._until
-        dtstart_weekdays = all_dtstart_weekdays(dtstart, NUM_DAYS) if rasp.random_dtstart_weekday else [dtstart]
-        rrule_table_element = get_rrule_table_element(rasp.rrule, dtstart_weekdays, until, time_structure)
-        if rrule_table_element not in rrule_table:
-            rrule_table.append(rrule_table_element)
-
+        rrule_key = (get_rrule_key(rasp.rrule), bool(rasp.random_dtstart_weekday))
+        if rrule_key not in expanded_rrules:
+            rrule_obj = rrulestr(rasp.rrule)
+            dtstart = rrule_obj._dtstart
+            until = rrule_obj._until
+            dtstart_weekdays = all_dtstart_weekdays(dtstart, NUM_DAYS) if rasp.random_dtstart_weekday else [dtstart]
+            rrule_table_element = get_rrule_table_element(rasp.rrule, dtstart_weekdays, until, time_structure)
+            element_key = get_rrule_table_element_key(rrule_table_element)
+            if element_key not in table_indices:
+                table_indices[element_key] = len(rrule_table)
+                rrule_table.append(rrule_table_element)
+            expanded_rrules[rrule_key] = (freqs[rrule_obj._freq], table_indices[element_key])
+
+        freq, table_index = expanded_rrules[rrule_key]
         dtstart_weekdays = []
-        for week, day in rrule_table_element.keys():
+        for week, day in rrule_table[table_index].keys():
             dtstart_weekdays.append((week, day))
 
-        rasp_rrules[rasp.id] = {"DTSTART": None, "UNTIL": None, "FREQ": freqs[rrule_obj._freq],
-                                "all_dates":[], "dtstart_weekdays": dtstart_weekdays,
-                                "rrule_table_index": rrule_table.index(rrule_table_element)}
+        rasp_rrules[rasp.id] = {"DTSTART": None, "UNTIL": None, "FREQ": freq,
+                                "all_dates":[], "all_dates_idx": np.empty(0, dtype=np.intp),
+                                "dtstart_weekdays": dtstart_weekdays,
+                                "rrule_table_index": table_index}
 
-    return rasp_rrules, rrule_table
+    rrule_dates = get_rrule_dates_table(rasps, rasp_rrules, rrule_table, time_structure)
+    return rasp_rrules, rrule_table, rrule_dates
@@ -0,0 +1,146 @@
+import bisect
+import numpy as np
+import data_api.occupancy_bits as bits_api
+from utilities.my_types import RoomsByCapacity, AvailabilityMap
+
+
+"""
+Returns RoomsByCapacity of a State: room capacities in ascending order and their room ids.
+Rooms that fit n students are then found with one bisect (see get_fitting_room_ids).
+"""
+def get_rooms_by_capacity(state):
+    rooms = sorted(state.rooms.values(), key=lambda room: room.capacity)
+    return RoomsByCapacity([room.capacity for room in rooms], [room.id for room in rooms])
+
+
+"""
+Returns ids of rooms without capacity or computer problems for rasp
+(see grade_tool.is_capacity_problematic and grade_tool.is_computer_problematic),
+in the order of state.rooms.
+"""
+def get_fitting_room_ids(state, rasp, rooms_by_capacity):
+    students = state.students_per_rasp[rasp.id]
+    start    = bisect.bisect_left(rooms_by_capacity.capacities, students)
+    fitting  = set(rooms_by_capacity.room_ids[start:])
+    if rasp.needs_computers:
+        fitting = {room_id for room_id in fitting if state.rooms[room_id].has_computers}
+    return [room_id for room_id in state.rooms if room_id in fitting]
+
+
+"""
+Returns a (NUM_WEEKS, NUM_DAYS, NUM_HOURS) boolean matrix of hours where rasp
+would collide in any of its semesters, with the same rules as
+move_utilities.any_collisions_in_sems:
+    1) own groups (other groups of rasp's type) may share an hour once
+    2) optional rasps may also share an hour with other optionals of the semester,
+       unless a group of another type of the same subject is there
+Rasp is taxed at its current slot, so its own starting dates are not counted as own groups.
+"""
+def get_sems_blocked(state, rasp):
+    constraints = state.mutable_constraints
+    index       = constraints.index
+    own_type    = str(rasp.subject_id) + str(rasp.type)
+
+    own_starts = np.zeros(constraints.groups_occupied.shape[1:], dtype=np.int64)
+    for week, day, hour in state.rasp_rrules[rasp.id]["all_dates"]:
+        own_starts[week, day, hour] = 1
+    group_occupied = constraints.groups_occupied[index.groups[own_type]]
+    in_own_groups  = group_occupied - own_starts > 0
+    in_other_groups = constraints.subjects_occupied[index.subjects[rasp.subject_id]] > group_occupied
+
+    blocked = np.zeros(own_starts.shape, dtype=bool)
+    for sem_id in rasp.mandatory_in_semester_ids:
+        sem_collisions = constraints.sems_collisions[index.sems[sem_id]]
+        blocked |= np.where(in_own_groups, sem_collisions > 1, sem_collisions > 0)
+    for sem_id in rasp.optional_in_semester_ids:
+        sem_collisions    = constraints.sems_collisions[index.sems[sem_id]]
+        optional_occupied = constraints.optionals_occupied[index.optionals[sem_id]]
+        blocked |= ~in_own_groups & ((optional_occupied == 0) | in_other_groups) & (sem_collisions > 0)
+        blocked |= sem_collisions > 1
+    return blocked
+
+
+"""
+Returns (dtstart_weeks, candidates) of rasp:
+    1) dtstart_weeks -> np.array of the week rasp starts in for each day (-1 if it can't start that day)
+    2) candidates    -> list of (day, hour, all_dates) of every starting (day, hour) allowed by
+                        rasp's rrule and fixed hour, all_dates taken from the memoized state.rrule_dates
+"""
+def get_candidate_starts(state, rasp):
+    NUM_DAYS  = state.time_structure.NUM_DAYS
+    NUM_HOURS = state.time_structure.NUM_HOURS
+    table_index = state.rasp_rrules[rasp.id]["rrule_table_index"]
+
+    dtstart_weeks = np.full(NUM_DAYS, -1, dtype=np.int64)
+    for week, day in state.rasp_rrules[rasp.id]["dtstart_weekdays"]:
+        if dtstart_weeks[day] == -1:
+            dtstart_weeks[day] = week
+
+    hours = list(range(NUM_HOURS)) if rasp.fixed_hour == None else [rasp.fixed_hour]
+    hours = [hour for hour in hours if hour + rasp.duration < NUM_HOURS]
+    candidates = []
+    for day in range(NUM_DAYS):
+        if dtstart_weeks[day] == -1:
+            continue
+        for hour in hours:
+            all_dates, _ = state.rrule_dates[(table_index, dtstart_weeks[day], day, hour, rasp.duration)]
+            candidates.append((day, hour, all_dates[::rasp.duration]))
+    return dtstart_weeks, candidates
+
+
+"""
+Returns AvailabilityMap of rasp: for every room without capacity or computer problems,
+which (day, hour) starts have no room, professor or semester collisions.
+All candidate starts are checked at once:
+    1) every starting date of every candidate is turned into one (week, day) hour mask
+    2) rooms -> one gather + AND of the rooms' occupied masks (bits_api)
+    3) professor and semesters -> one shared mask, checked once for all rooms
+    4) collisions are summed per candidate with a cumulative sum
+bits (bits_api.get_occupancy_bits of state.mutable_constraints) and rooms_by_capacity
+are built if not given, pass them in when querying many rasps of the same timetable.
+"""
+def get_availability_map(state, rasp, bits=None, rooms_by_capacity=None):
+    NUM_DAYS  = state.time_structure.NUM_DAYS
+    NUM_HOURS = state.time_structure.NUM_HOURS
+    bits              = bits or bits_api.get_occupancy_bits(state.mutable_constraints)
+    rooms_by_capacity = rooms_by_capacity or get_rooms_by_capacity(state)
+    room_ids          = get_fitting_room_ids(state, rasp, rooms_by_capacity)
+    dtstart_weeks, candidates = get_candidate_starts(state, rasp)
+
+    free = np.zeros((len(room_ids), NUM_DAYS, NUM_HOURS), dtype=bool)
+    if not room_ids or not candidates:
+        return AvailabilityMap(room_ids, dtstart_weeks, free)
+
+    all_dates = [date for _, _, dates in candidates for date in dates]
+    ends      = np.cumsum([len(dates) for _, _, dates in candidates])
+    starts    = ends - np.array([len(dates) for _, _, dates in candidates])
+    weeks, days, path_masks = bits_api.dates_to_masks(all_dates, rasp.duration)
+
+    index      = bits.occupied.index
+    room_masks = bits.occupied.rooms_occupied[[index.rooms[room_id] for room_id in room_ids]]
+    prof_masks = bits.occupied.profs_occupied[index.profs[rasp.professor_id]]
+    sems_masks = bits_api.hours_to_masks(get_sems_blocked(state, rasp))
+
+    shared = ((prof_masks[weeks, days] | sems_masks[weeks, days]) & path_masks) != 0
+    hits   = ((room_masks[:, weeks, days] & path_masks) != 0) | shared
+
+    hits_sums  = np.concatenate((np.zeros((len(room_ids), 1), dtype=np.int64), hits.cumsum(axis=1)), axis=1)
+    collisions = hits_sums[:, ends] - hits_sums[:, starts]
+    candidate_days  = [day for day, _, _ in candidates]
+    candidate_hours = [hour for _, hour, _ in candidates]
+    free[:, candidate_days, candidate_hours] = collisions == 0
+    return AvailabilityMap(room_ids, dtstart_weeks, free)
+
+
+"""
+Returns {room_id : list of free (week, day, hour) starts} of an AvailabilityMap.
+Rooms without free starts are left out.
+"""
+def get_free_starts(availability):
+    free_starts = {}
+    for i, room_id in enumerate(availability.room_ids):
+        days, hours = np.nonzero(availability.free[i])
+        if len(days):
+            free_starts[room_id] = [(int(availability.dtstart_weeks[day]), int(day), int(hour))
+                                    for day, hour in zip(days, hours)]
+    return free_starts
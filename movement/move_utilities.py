@@ -1,13 +1,23 @@
-import numpy as np
-import data_api.constraints as cons_api
+"""
+Returns True if (week, day, hour) is taken by another group of the rasp's type.
+Rasp is taxed at its current slot, so its own all_dates are not counted.
+"""
+def in_own_groups(state, rasp, own_dates, week, day, hour):
+    own_type = str(rasp.subject_id) + str(rasp.type)
+    index    = state.mutable_constraints.index
+    group_occupied = state.mutable_constraints.groups_occupied[index.groups[own_type]]
+    return int(group_occupied[week, day, hour]) - ((week, day, hour) in own_dates) > 0
 
 
 """
-Returns True if entire new_all_dates path has no collisions in given 3D matrix.
+Returns True if (week, day, hour) is taken by a group of other types of the rasp's subject.
 """
-def any_collisions_in_matrix3D(rasp, new_all_dates, matrix3D):
-    return any(np.any(matrix3D[week, day, hour:(hour + rasp.duration)]>0)
-               for week,day,hour in new_all_dates)
+def in_other_groups(state, rasp, week, day, hour):
+    own_type = str(rasp.subject_id) + str(rasp.type)
+    index    = state.mutable_constraints.index
+    group_occupied   = state.mutable_constraints.groups_occupied[index.groups[own_type]]
+    subject_occupied = state.mutable_constraints.subjects_occupied[index.subjects[rasp.subject_id]]
+    return subject_occupied[week, day, hour] > group_occupied[week, day, hour]
 
 
 """
@@ -15,14 +25,16 @@ Returns True if entire new_all_dates path has no collisions in sem_collisions.
 Only activated when rasp is mandatory in given semester.
 """
 def any_collisions_in_mandatory_rasp(state, new_all_dates, rasp, sem_id):
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
+    own_dates      = set(state.rasp_rrules[rasp.id]["all_dates"])
+    sem_row        = state.mutable_constraints.index.sems[sem_id]
+    sem_collisions = state.mutable_constraints.sems_collisions[sem_row]
 
     for week, day, hour in new_all_dates:
         for hr in range(hour, hour + rasp.duration):
-            if (week, day, hr) not in own_group_dates and sem_collisions[week, day, hr] > 0:
+            in_own_group = in_own_groups(state, rasp, own_dates, week, day, hr)
+            if not in_own_group and sem_collisions[week, day, hr] > 0:
                 return True
-            elif (week, day, hr) in own_group_dates and sem_collisions[week, day, hr] > 1:
+            elif in_own_group and sem_collisions[week, day, hr] > 1:
                 return True
     return False
 
@@ -32,14 +44,15 @@ Returns True if entire new_all_dates path has no collisions in sem_collisions.
 Only activated when rasp is optional in given semester.
 """
 def any_collisions_in_optional_rasp(state, new_all_dates, rasp, sem_id):
-    sem_collisions = state.mutable_constraints.sems_collisions[sem_id]
-    optional_occupied = state.mutable_constraints.optionals_occupied[sem_id]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    other_groups_dates = cons_api.get_other_groups_all_dates(state, rasp)
+    index = state.mutable_constraints.index
+    sem_collisions = state.mutable_constraints.sems_collisions[index.sems[sem_id]]
+    optional_occupied = state.mutable_constraints.optionals_occupied[index.optionals[sem_id]]
+    own_dates = set(state.rasp_rrules[rasp.id]["all_dates"])
 
     for week, day, hour in new_all_dates:
         for hr in range(hour, hour + rasp.duration):
-            if not (week, day, hr) in own_group_dates and (optional_occupied[week, day, hr] == 0 or (week, day, hr) in other_groups_dates) \
+            if not in_own_groups(state, rasp, own_dates, week, day, hr) and \
+               (optional_occupied[week, day, hr] == 0 or in_other_groups(state, rasp, week, day, hr)) \
                and sem_collisions[week, day, hr] > 0:
                     return True
             elif sem_collisions[week, day, hr] > 1:
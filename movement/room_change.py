@@ -1,5 +1,5 @@
-import optimizer.grade_tool as grade_tool
-import movement.movement as move_tool
+import movement.availability as availability_api
+import data_api.occupancy_bits as bits_api
 from utilities.general_utilities import load_state
 
 
@@ -11,23 +11,23 @@ at least one free slot there (no rrule collisions of rooms, profs, and semesters
 Function iterates through all rasps and prints available rooms for illustrative purposes.
 In practice, user would click on 1 rasp and function would return available rooms
 just for that rasp.
+Each rasp is checked in all rooms at once (see availability_api.get_availability_map).
 """
 def analyze_room_change():
     state = load_state()
     timetable = state.timetable
     rooms = state.rooms
     students_per_rasp = state.students_per_rasp
+    bits = bits_api.get_occupancy_bits(state.mutable_constraints)
+    rooms_by_capacity = availability_api.get_rooms_by_capacity(state)
 
     for rasp, _ in timetable.items():
-        found = False
-        for room in rooms.values():
-            if not grade_tool.is_capacity_problematic(state, rasp, room.id) and \
-               not grade_tool.is_computer_problematic(state, rasp, room.id):
-                   other_free_slots = move_tool.get_other_free_slots(state, rasp, room.id)
-                   if other_free_slots:
-                       found = True
-                       print(rasp.id, students_per_rasp[rasp.id], "|", room.id, room.capacity, room.has_computers, other_free_slots)
-        if not found:
+        availability = availability_api.get_availability_map(state, rasp, bits, rooms_by_capacity)
+        free_starts = availability_api.get_free_starts(availability)
+        for room_id, other_free_slots in free_starts.items():
+            room = rooms[room_id]
+            print(rasp.id, students_per_rasp[rasp.id], "|", room.id, room.capacity, room.has_computers, other_free_slots)
+        if not free_starts:
             print(rasp.id, students_per_rasp[rasp.id], "| didn't find a room.")
 
 analyze_room_change()
@@ -0,0 +1,192 @@
+import json
+import argparse
+import optimizer.grade_tool as grade_tool
+import optimizer.tax_tool   as tax_tool
+import optimizer.rasp_slots as rasp_slots
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from utilities.my_types import Slot
+from utilities.general_utilities import load_state, load_settings, save_timetable_to_file
+
+
+"""
+Returns [(slot, GradeDelta)] of rasp placed at each of the slots (see grade_tool.evaluate_slots).
+rasp is untaxed from its current slot for the evaluation and taxed back after it,
+so its own dates are not counted as collisions.
+"""
+def evaluate_rasp_slots(state, rasp, slots):
+    old_slot = state.timetable.get(rasp)
+    if old_slot is None:
+        return grade_tool.evaluate_slots(state, rasp, slots)
+
+    tax_tool.untax_old_slot(state, rasp, old_slot)
+    try:
+        return grade_tool.evaluate_slots(state, rasp, slots)
+    finally:
+        tax_tool.tax_new_slot(state, rasp, old_slot)
+
+
+"""
+Returns True if a GradeDelta has no room, professor or sem collisions.
+"""
+def is_collision_free(grade_delta):
+    return grade_delta.roomScore == 0 and grade_delta.professorScore == 0 and grade_delta.semScore == 0
+
+
+"""
+Returns a list of Slots in room_id (rasp's current room by default) where rasp
+can be moved to without room, professor or sem collisions.
+Slots are taken from the memoized rrule_dates (see rasp_slots.get_all_rasp_slots).
+"""
+def get_free_slots(state, rasp, room_id=None):
+    room_id = room_id or state.timetable[rasp].room_id
+    slots = [slot for slot in rasp_slots.get_all_rasp_slots(state, rasp) if slot.room_id == room_id]
+    return [slot for slot, grade_delta in evaluate_rasp_slots(state, rasp, slots) if is_collision_free(grade_delta)]
+
+
+"""
+Returns {room_id : list of Slots} of rooms without capacity or computer problems
+where rasp can be moved to without room, professor or sem collisions.
+"""
+def get_free_rooms(state, rasp):
+    free_rooms = {}
+    for slot, grade_delta in evaluate_rasp_slots(state, rasp, rasp_slots.get_all_rasp_slots(state, rasp)):
+        if is_collision_free(grade_delta) and grade_delta.capacityScore == 0 and grade_delta.computerScore == 0:
+            free_rooms.setdefault(slot.room_id, []).append(slot)
+    return {room_id : sorted(slots) for room_id, slots in free_rooms.items()}
+
+
+"""
+Moves rasp to slot (untaxes its current slot and taxes the new one).
+Raises ValueError if slot is not a possible starting slot of rasp.
+Returns the new grade of the State.
+"""
+def apply_move(state, rasp, slot):
+    if slot not in set(rasp_slots.get_all_rasp_slots(state, rasp)):
+        raise ValueError(f"{slot} is not a possible slot of {rasp.id}.")
+
+    old_slot = state.timetable.get(rasp)
+    if old_slot is not None:
+        tax_tool.untax_old_slot(state, rasp, old_slot)
+    tax_tool.tax_new_slot(state, rasp, slot)
+    return state.grade
+
+
+"""
+Raised by request handlers for an unknown resource (answered with status 404).
+"""
+class NotFoundError(Exception):
+    pass
+
+
+"""
+HTTPServer that keeps a State in memory. Requests are handled one at a time,
+so moves never interleave with queries.
+"""
+class MovementServer(HTTPServer):
+    def __init__(self, address, state):
+        super().__init__(address, MovementHandler)
+        self.state = state
+        self.rasps = {rasp.id : rasp for rasp in state.rasps}
+
+
+"""
+JSON over HTTP interface of a MovementServer:
+    GET  /free_slots?rasp_id=X[&room_id=R] -> {"rasp_id", "room_id", "free_slots": [slot]}
+    GET  /rooms?rasp_id=X                  -> {"rasp_id", "rooms": {room_id: [slot]}}
+    GET  /grade                            -> {"grade"}
+    POST /move {"rasp_id", "room_id", "week", "day", "hour"} -> {"rasp_id", "slot", "grade"}
+    POST /save                             -> {"path"} (saves State to settings["path_state"])
+A slot is {"room_id", "week", "day", "hour"}. Errors are {"error": message} with status 400
+(invalid request, e.g. a body that isn't a JSON object) or 404 (unknown path, rasp_id or room_id).
+"""
+class MovementHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url    = urlparse(self.path)
+        params = {key : values[0] for key, values in parse_qs(url.query).items()}
+        routes = {"/free_slots": self.free_slots, "/rooms": self.rooms, "/grade": self.grade}
+        self.route(routes, url.path, params)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self.send_json(400, {"error": "Request body is not valid JSON."})
+        if not isinstance(body, dict):
+            return self.send_json(400, {"error": "Request body must be a JSON object."})
+        routes = {"/move": self.move, "/save": self.save}
+        self.route(routes, urlparse(self.path).path, body)
+
+    def route(self, routes, path, params):
+        if path not in routes:
+            return self.send_json(404, {"error": f"Unknown path {path}."})
+        try:
+            self.send_json(200, routes[path](params))
+        except NotFoundError as e:
+            self.send_json(404, {"error": str(e)})
+        except (KeyError, ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+
+    def get_rasp(self, params):
+        rasp_id = params.get("rasp_id")
+        if rasp_id is None:
+            raise ValueError("Missing rasp_id.")
+        if rasp_id not in self.server.rasps:
+            raise NotFoundError(f"Unknown rasp_id {rasp_id}.")
+        return self.server.rasps[rasp_id]
+
+    def free_slots(self, params):
+        state, rasp = self.server.state, self.get_rasp(params)
+        room_id = params.get("room_id")
+        if not room_id:
+            if state.timetable.get(rasp) is None:
+                raise ValueError(f"{rasp.id} is not placed, give a room_id.")
+            room_id = state.timetable[rasp].room_id
+        if room_id not in state.rooms:
+            raise NotFoundError(f"Unknown room_id {room_id}.")
+        free_slots = get_free_slots(state, rasp, room_id)
+        return {"rasp_id": rasp.id, "room_id": room_id, "free_slots": [slot._asdict() for slot in free_slots]}
+
+    def rooms(self, params):
+        rasp = self.get_rasp(params)
+        free_rooms = get_free_rooms(self.server.state, rasp)
+        return {"rasp_id": rasp.id,
+                "rooms": {room_id : [slot._asdict() for slot in slots] for room_id, slots in free_rooms.items()}}
+
+    def grade(self, params):
+        return {"grade": {name : int(score) for name, score in self.server.state.grade.items()}}
+
+    def move(self, params):
+        rasp = self.get_rasp(params)
+        slot = Slot(str(params["room_id"]), int(params["week"]), int(params["day"]), int(params["hour"]))
+        apply_move(self.server.state, rasp, slot)
+        return {"rasp_id": rasp.id, "slot": slot._asdict(), **self.grade(params)}
+
+    def save(self, params):
+        path = load_settings()["path_state"]
+        save_timetable_to_file(self.server.state, path)
+        return {"path": path}
+
+    def send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+args = parser.parse_args()
+
+server = MovementServer((args.host, args.port), load_state())
+print(f"Movement server listening on http://{args.host}:{args.port}")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()
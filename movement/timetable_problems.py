@@ -13,17 +13,18 @@ def analyze_timetable():
     rooms_occupied = state.mutable_constraints.rooms_occupied
     profs_occupied = state.mutable_constraints.profs_occupied
     sems_collisions = state.mutable_constraints.sems_collisions
+    index = state.mutable_constraints.index
 
     for rasp, slot in timetable.items():
         room_id, _, _, _ = slot
         for week, day, hour in rasp_rrules[rasp.id]["all_dates"]:
-            if rooms_occupied[room_id][week, day, hour] > 1:
+            if rooms_occupied[index.rooms[room_id], week, day, hour] > 1:
                 print(f"{rasp.id} has a room collision at {room_id} {week},{day},{hour}")
-            if profs_occupied[rasp.professor_id][week, day, hour] > 1:
+            if profs_occupied[index.profs[rasp.professor_id], week, day, hour] > 1:
                 print(f"{rasp.id} has a professor collision at {rasp.professor_id} {week},{day},{hour}")
             sem_ids = rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids
             for sem_id in sem_ids:
-                if sems_collisions[sem_id][week, day, hour] > 1:
+                if sems_collisions[index.sems[sem_id], week, day, hour] > 1:
                     print(f"{rasp.id} has a semester collision at {sem_id} at {week},{day},{hour}")
 
         if grade_tool.is_capacity_problematic(state, rasp, room_id):
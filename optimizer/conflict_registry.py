@@ -0,0 +1,139 @@
+from collections import defaultdict
+import optimizer.grade_tool as grade_tool
+from utilities.my_types import ConflictRegistry
+
+# Random picks tried before random_problematic_rasp filters the whole registry by tabu_list
+RANDOM_PICK_TRIES = 8
+
+"""
+Returns a ConflictRegistry of a State:
+    1) rasps and positions -> problematic rasps in a list and their list positions
+       (O(1) add, remove and random pick)
+    2) room_rasps -> rasps currently placed in each room
+    3) prof_rasps and sem_rasps -> rasps of each professor and semester (static)
+Problematic rasps of the current timetable are found with one full scan.
+"""
+def get_conflict_registry(state):
+    prof_rasps, sem_rasps = defaultdict(set), defaultdict(set)
+    for rasp in state.rasps:
+        prof_rasps[rasp.professor_id].add(rasp)
+        for sem_id in rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids:
+            sem_rasps[sem_id].add(rasp)
+
+    registry = ConflictRegistry([], {}, defaultdict(set), dict(prof_rasps), dict(sem_rasps))
+    for rasp, slot in state.timetable.items():
+        if slot is None:
+            continue
+        registry.room_rasps[slot.room_id].add(rasp)
+        if grade_tool.is_rasp_problematic(state, rasp, slot.room_id):
+            add_rasp(registry, rasp)
+    return registry
+
+
+"""
+Adds rasp to the problematic rasps (if it's not already there).
+"""
+def add_rasp(registry, rasp):
+    if rasp in registry.positions:
+        return
+    registry.positions[rasp] = len(registry.rasps)
+    registry.rasps.append(rasp)
+
+
+"""
+Removes rasp from the problematic rasps (if it's there).
+The last rasp is moved into the freed position so the list stays dense.
+"""
+def remove_rasp(registry, rasp):
+    position = registry.positions.pop(rasp, None)
+    if position is None:
+        return
+    last_rasp = registry.rasps.pop()
+    if last_rasp != rasp:
+        registry.rasps[position] = last_rasp
+        registry.positions[last_rasp] = position
+
+
+"""
+Adds or removes rasp depending on whether it's currently problematic.
+Rasps that are not placed in the timetable are removed.
+"""
+def recheck_rasp(state, rasp):
+    slot = state.timetable.get(rasp)
+    if slot is not None and grade_tool.is_rasp_problematic(state, rasp, slot.room_id):
+        add_rasp(state.conflict_registry, rasp)
+    else:
+        remove_rasp(state.conflict_registry, rasp)
+
+
+"""
+Returns rasps whose problematic status could have been changed by (un)taxing
+the all_dates_idx path of rasp at room_id.
+A room/prof/sem collision appears or disappears only where a count crosses
+between 1 and 2, so only matrices with flip_count along the path are checked:
+    - flip_count=2 after taxing (1 -> 2)
+    - flip_count=1 after untaxing (2 -> 1)
+"""
+def get_affected_rasps(state, rasp, room_id, all_dates_idx, flip_count):
+    registry = state.conflict_registry
+    rooms_occupied  = state.mutable_constraints.rooms_occupied
+    profs_occupied  = state.mutable_constraints.profs_occupied
+    sems_collisions = state.mutable_constraints.sems_collisions
+    index           = state.mutable_constraints.index
+
+    affected = set()
+    if (rooms_occupied[index.rooms[room_id]].ravel()[all_dates_idx] == flip_count).any():
+        affected |= registry.room_rasps[room_id]
+    if (profs_occupied[index.profs[rasp.professor_id]].ravel()[all_dates_idx] == flip_count).any():
+        affected |= registry.prof_rasps[rasp.professor_id]
+    for sem_id in rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids:
+        if (sems_collisions[index.sems[sem_id]].ravel()[all_dates_idx] == flip_count).any():
+            affected |= registry.sem_rasps[sem_id]
+    return affected
+
+
+"""
+Updates the registry after rasp was taxed at slot (see tax_tool.tax_new_slot).
+Affected rasps are rechecked by id so the order of registry.rasps doesn't depend on hashing.
+"""
+def update_after_tax(state, rasp, slot):
+    all_dates_idx = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    state.conflict_registry.room_rasps[slot.room_id].add(rasp)
+
+    affected = get_affected_rasps(state, rasp, slot.room_id, all_dates_idx, 2)
+    affected.add(rasp)
+    for other_rasp in sorted(affected, key=lambda x: x.id):
+        recheck_rasp(state, other_rasp)
+
+
+"""
+Updates the registry after rasp was untaxed from slot (see tax_tool.untax_old_slot).
+Expects rasp to be already removed from the timetable.
+"""
+def update_after_untax(state, rasp, slot, all_dates_idx):
+    registry = state.conflict_registry
+    registry.room_rasps[slot.room_id].discard(rasp)
+    remove_rasp(registry, rasp)
+
+    affected = get_affected_rasps(state, rasp, slot.room_id, all_dates_idx, 1)
+    affected.discard(rasp)
+    for other_rasp in sorted(affected, key=lambda x: x.id):
+        recheck_rasp(state, other_rasp)
+
+
+"""
+Returns a uniformly random (drawn from rng) problematic rasp whose id is not
+in tabu_list, or None if there is no such rasp.
+"""
+def random_problematic_rasp(registry, tabu_list, rng):
+    rasps = registry.rasps
+    if not rasps:
+        return None
+
+    for _ in range(RANDOM_PICK_TRIES):
+        rasp = rng.choice(rasps)
+        if rasp.id not in tabu_list:
+            return rasp
+
+    candidates = [rasp for rasp in rasps if rasp.id not in tabu_list]
+    return rng.choice(candidates) if candidates else None
@@ -1,9 +1,11 @@
 import math
-import random
+import numpy as np
 import data_api.constraints as cons_api
 import optimizer.tax_tool as tax_tool
-from optimizer.taxing.tax_sems import sems_tax_punish
+from optimizer.taxing.tax_sems import sems_tax_punish_array
 import optimizer.rasp_slots as rasp_slots
+import optimizer.conflict_registry as conflict_registry
+from utilities.my_types import GradeDelta
 
 """
 Returns an empty grade object.
@@ -53,30 +55,33 @@ def is_capacity_problematic(state, rasp, room_id):
 
 
 """
-Returns True if rasp has any room collisions in its all_dates path.
+Returns True if rasp has any room collisions in its all_dates_idx path.
 """
-def is_room_problematic(state, room_id, all_dates):
+def is_room_problematic(state, room_id, all_dates_idx):
     rooms_occupied = state.mutable_constraints.rooms_occupied
-    return any(rooms_occupied[room_id][week, day, hour]>1 for week, day, hour in all_dates)
+    room_row       = state.mutable_constraints.index.rooms[room_id]
+    return bool((rooms_occupied[room_row].ravel()[all_dates_idx] > 1).any())
 
 
 """
-Returns True if rasp has any professor collisions in its all_dates path.
+Returns True if rasp has any professor collisions in its all_dates_idx path.
 """
-def is_prof_problematic(state, rasp, all_dates):
+def is_prof_problematic(state, rasp, all_dates_idx):
     profs_occupied = state.mutable_constraints.profs_occupied
-    return any(profs_occupied[rasp.professor_id][week, day, hour]>1 for week, day, hour in all_dates)
+    prof_row       = state.mutable_constraints.index.profs[rasp.professor_id]
+    return bool((profs_occupied[prof_row].ravel()[all_dates_idx] > 1).any())
 
 
 """
-Returns True if rasp has any sem collisions in its all_dates path.
+Returns True if rasp has any sem collisions in its all_dates_idx path.
 """
-def is_sem_problematic(state, rasp, all_dates):
+def is_sem_problematic(state, rasp, all_dates_idx):
     sems_collisions = state.mutable_constraints.sems_collisions
+    sems_index      = state.mutable_constraints.index.sems
     sem_ids = rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids
 
     for sem_id in sem_ids:
-        if any(sems_collisions[sem_id][week, day, hour]>1 for week, day, hour in all_dates):
+        if (sems_collisions[sems_index[sem_id]].ravel()[all_dates_idx] > 1).any():
             return True
     return False
 
@@ -91,134 +96,188 @@ def is_rasp_problematic(state, rasp, room_id):
        is_capacity_problematic(state, rasp, room_id):
            return True
 
-    all_dates = state.rasp_rrules[rasp.id]["all_dates"]
-    if is_room_problematic(state, room_id, all_dates) or \
-       is_prof_problematic(state, rasp, all_dates) or \
-       is_sem_problematic(state, rasp, all_dates):
+    all_dates_idx = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    if is_room_problematic(state, room_id, all_dates_idx) or \
+       is_prof_problematic(state, rasp, all_dates_idx) or \
+       is_sem_problematic(state, rasp, all_dates_idx):
                return True
     return False
 
 
-
 """
 Returns a grade_obj that represents collisions along the rasp's all_dates path
 (room, prof, sems), together with capacity and computer collisions.
-The function and its subfunctions assume that rasp's all_dates have NOT yet been taxed.
-That's why they simulate taxing by adding "+1" to matrix positions.
+Dict form of evaluate_move, kept for callers that work with grade dicts.
 """
 def count_all_collisions(state, slot, rasp):
-    room_occupied = state.mutable_constraints.rooms_occupied[slot.room_id]
-    prof_occupied = state.mutable_constraints.profs_occupied[rasp.professor_id]
+    return evaluate_move(state, rasp, slot)._asdict()
+
+
+"""
+Returns a GradeDelta that represents collisions the rasp would have if it was
+placed at a given slot: room, prof, sems, capacity and computer scores.
+The all_dates path of the slot is computed from rrule_table, so the function
+only reads state and never changes it (rasp_rrules included).
+The function and its subfunctions assume that the rasp has NOT been taxed
+(e.g. it was untaxed with tax_tool.untax_old_slot). That's why they simulate
+taxing by adding "+1" to matrix positions.
+"""
+def evaluate_move(state, rasp, slot):
+    index         = state.mutable_constraints.index
+    room_occupied = state.mutable_constraints.rooms_occupied[index.rooms[slot.room_id]]
+    prof_occupied = state.mutable_constraints.profs_occupied[index.profs[rasp.professor_id]]
+    all_dates_idx = rasp_slots.get_all_dates_index(state, rasp, slot)
+
+    room_score      = count_rrule_in_matrix3D(all_dates_idx, room_occupied)
+    professor_score = count_rrule_in_matrix3D(all_dates_idx, prof_occupied)
+    sem_score       = count_rrule_in_sems(state, rasp, all_dates_idx)
+    capacity_score  = -30 * is_capacity_problematic(state, rasp, slot.room_id)
+    computer_score  = -30 * is_strong_computer_problematic(state, rasp, slot.room_id)
+    total_score     = room_score + professor_score + capacity_score + computer_score + sem_score
+    return GradeDelta(total_score, room_score, professor_score, capacity_score, computer_score, sem_score)
+
+
+"""
+Returns {room_id : GradeDelta} for rasp placed at (week, day, hour) in each room of room_ids.
+Prof and sem scores don't depend on the room, so they are calculated once.
+Room collisions of all rooms are read with one gather from rooms_occupied and
+capacity and computer scores are calculated as vectors over room_ids.
+Same assumptions as evaluate_move (the rasp is not taxed, state isn't changed).
+"""
+def evaluate_position(state, rasp, week, day, hour, room_ids):
+    rooms          = state.rooms
+    index          = state.mutable_constraints.index
+    rooms_occupied = state.mutable_constraints.rooms_occupied
+    prof_occupied  = state.mutable_constraints.profs_occupied[index.profs[rasp.professor_id]]
+    rrule_index    = state.rasp_rrules[rasp.id]["rrule_table_index"]
+    all_dates_idx  = state.rrule_dates[(rrule_index, week, day, hour, rasp.duration)][1]
+
+    professor_score = count_rrule_in_matrix3D(all_dates_idx, prof_occupied)
+    sem_score       = count_rrule_in_sems(state, rasp, all_dates_idx)
+
+    room_rows       = np.fromiter((index.rooms[room_id] for room_id in room_ids), dtype=np.intp, count=len(room_ids))
+    room_counts     = rooms_occupied.reshape(len(rooms_occupied), -1)[room_rows[:, None], all_dates_idx].astype(np.int64) + 1
+    room_scores     = -30 * np.where(room_counts > 1, room_counts, 0).sum(axis=1)
+    capacities      = np.fromiter((rooms[room_id].capacity for room_id in room_ids), dtype=np.int64, count=len(room_ids))
+    has_computers   = np.fromiter((rooms[room_id].has_computers for room_id in room_ids), dtype=bool, count=len(room_ids))
+    capacity_scores = -30 * (state.students_per_rasp[rasp.id] - capacities > 0)
+    computer_scores = -30 * (~has_computers & rasp.needs_computers)
+    total_scores    = room_scores + professor_score + capacity_scores + computer_scores + sem_score
+
+    return {room_id : GradeDelta(int(total_scores[i]), int(room_scores[i]), professor_score,
+                                 int(capacity_scores[i]), int(computer_scores[i]), sem_score)
+            for i, room_id in enumerate(room_ids)}
+
+
+"""
+Returns GradeDelta of rasp placed at slot (same as evaluate_move).
+Grades of all rooms of room_ids at the slot's (week, day, hour) are calculated
+at once (see evaluate_position) and kept in position_grades, so other rooms
+at the same time position are only looked up.
+"""
+def evaluate_move_batched(state, rasp, slot, room_ids, position_grades):
+    position = (slot.week, slot.day, slot.hour)
+    if position not in position_grades:
+        position_grades[position] = evaluate_position(state, rasp, slot.week, slot.day, slot.hour, room_ids)
+    return position_grades[position][slot.room_id]
+
+
+"""
+Returns a list of (slot, GradeDelta) for rasp placed at each of the slots,
+ranked from the best totalScore to the worst (slots with equal totalScore keep their order).
+Slots are scored per time position (see evaluate_position).
+"""
+def evaluate_slots(state, rasp, slots):
+    position_rooms = {}
+    for slot in slots:
+        position_rooms.setdefault((slot.week, slot.day, slot.hour), []).append(slot.room_id)
 
-    grade_obj                   = {"totalScore": 0, "roomScore": 0, "professorScore": 0, "capacityScore": 0, "computerScore": 0, "semScore": 0}
-    grade_obj["roomScore"]      = count_rrule_in_matrix3D(state, rasp, room_occupied)
-    grade_obj["professorScore"] = count_rrule_in_matrix3D(state, rasp, prof_occupied)
-    grade_obj["semScore"]       = count_rrule_in_sems(state, rasp)
-    grade_obj["capacityScore"]  = -30 * is_capacity_problematic(state, rasp, slot.room_id)
-    grade_obj["computerScore"]  = -30 * is_strong_computer_problematic(state, rasp, slot.room_id)
-    grade_obj["totalScore"]     = sum(grade_obj.values())
-    return grade_obj
+    position_grades = {position : evaluate_position(state, rasp, *position, room_ids)
+                       for position, room_ids in position_rooms.items()}
+    candidates = [(slot, position_grades[(slot.week, slot.day, slot.hour)][slot.room_id]) for slot in slots]
+    candidates.sort(key=lambda x:x[1].totalScore, reverse=True)
+    return candidates
 
 
 """
-Returns -30 * number of collisions along the rasp's all_dates path in a given 3D matrix.
+Returns -30 * number of collisions along the all_dates_idx path in a given 3D matrix.
+The whole path is read with one gather from the raveled matrix.
 """
-def count_rrule_in_matrix3D(state, rasp, matrix3D):
-    all_dates = state.rasp_rrules[rasp.id]["all_dates"]
-    return -30 * sum(matrix3D[week, day, hour]+1
-                     for week,day,hour in all_dates
-                     if matrix3D[week, day, hour]+1 > 1)
+def count_rrule_in_matrix3D(all_dates_idx, matrix3D):
+    counts = matrix3D.ravel()[all_dates_idx].astype(np.int64) + 1
+    return -30 * int(counts[counts > 1].sum())
 
 
 """
-Returns -30 * number of collisions along the rasp's all_dates path in sem_collisions.
+Returns -30 * number of collisions along the all_dates_idx path in sem_collisions.
 This is only activated if rasp is mandatory in a given semester.
 """
-def count_rrule_in_mandatory_rasp(state, rasp, sem_id):
-    all_dates       = state.rasp_rrules[rasp.id]["all_dates"]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
+def count_rrule_in_mandatory_rasp(state, rasp, sem_id, all_dates_idx):
+    sem_row         = state.mutable_constraints.index.sems[sem_id]
+    sem_occupied    = state.mutable_constraints.sems_occupied[sem_row].ravel()
+    sem_collisions  = state.mutable_constraints.sems_collisions[sem_row].ravel()
 
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
-        new_cnt_colls = old_cnt_colls + 1 if (week, day, hour) not in own_group_dates else old_cnt_colls
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
-    return punish
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
+    not_own_group = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx)
+    new_cnt_colls = old_cnt_colls + not_own_group
+    return sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
 
 """
-Returns -30 * number of collisions along the rasp's all_dates path in sem_collisions.
+Returns -30 * number of collisions along the all_dates_idx path in sem_collisions.
 This is only activated if rasp is optional in a given semester.
 """
-def count_rrule_in_optional_rasp(state, rasp, sem_id):
-    all_dates = state.rasp_rrules[rasp.id]["all_dates"]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    other_groups_dates = cons_api.get_other_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    optional_occupied = state.mutable_constraints.optionals_occupied[sem_id]
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
+def count_rrule_in_optional_rasp(state, rasp, sem_id, all_dates_idx):
+    index             = state.mutable_constraints.index
+    sem_occupied      = state.mutable_constraints.sems_occupied[index.sems[sem_id]].ravel()
+    optional_occupied = state.mutable_constraints.optionals_occupied[index.optionals[sem_id]].ravel()
+    sem_collisions    = state.mutable_constraints.sems_collisions[index.sems[sem_id]].ravel()
 
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
-        new_cnt_colls = 0
-        if not (week, day, hour) in own_group_dates and (optional_occupied[week, day, hour] == 0 or (week, day, hour) in other_groups_dates):
-            new_cnt_colls = old_cnt_colls + 1
-        else:
-            new_cnt_colls = old_cnt_colls
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
-    return punish
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
+    collides      = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx) & \
+                    ((optional_occupied[all_dates_idx] == 0) | cons_api.in_other_groups_dates(state, rasp, all_dates_idx))
+    new_cnt_colls = old_cnt_colls + collides
+    return sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
 
 
 """
-Returns -30 * number of collisions along the rasp's all_dates path in sems_collisions.
+Returns -30 * number of collisions along the all_dates_idx path in sems_collisions.
 Used to calculate semester collisions.
 """
-def count_rrule_in_sems(state, rasp):
+def count_rrule_in_sems(state, rasp, all_dates_idx):
     sem_ids = rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids
     punish = 0
     for sem_id in sem_ids:
         rasp_mandatory = True if sem_id in rasp.mandatory_in_semester_ids else False
         if rasp_mandatory:
-            punish += count_rrule_in_mandatory_rasp(state, rasp, sem_id)
+            punish += count_rrule_in_mandatory_rasp(state, rasp, sem_id, all_dates_idx)
         else:
-            punish += count_rrule_in_optional_rasp(state, rasp, sem_id)
+            punish += count_rrule_in_optional_rasp(state, rasp, sem_id, all_dates_idx)
     return punish
 
 
+"""
+Returns a random problematic rasp that is not in tabu_list (or None).
+Picked from the conflict registry, so the timetable isn't scanned.
+"""
 def random_problematic_rasp(state, tabu_list):
-    timetable = state.timetable
-    rasps = list(timetable.keys())
-    random.shuffle(rasps)
-    rasp0 = None
-    for rasp in rasps:
-        if rasp.id in tabu_list:
-            continue
-        room_id, _, _, _= timetable[rasp]
-        if is_rasp_problematic(state, rasp, room_id):
-            rasp0 = rasp
-            break
-    return rasp0
+    return conflict_registry.random_problematic_rasp(state.conflict_registry, tabu_list, state.rng)
 
 
+"""
+Returns (rasp0, rasp1) where rasp0 is a random problematic rasp (not in tabu_list1)
+and rasp1 is a random rasp that rasp0 can swap slots with (not in tabu_list2[rasp0.id]).
+"""
 def problematic_rasp_pair(state, tabu_list1, tabu_list2):
     timetable = state.timetable
-    rasps = list(timetable.keys())
-    random.shuffle(rasps)
-    rasp0, rasp1 = None, None
-
-    for rasp in rasps:
-        if rasp.id in tabu_list1:
-            continue
-        room_id, _, _, _= timetable[rasp]
-        if is_rasp_problematic(state, rasp, room_id):
-            rasp0 = rasp
-            break
+    rasp0, rasp1 = random_problematic_rasp(state, tabu_list1), None
 
     if not rasp0:
         return None, None
 
+    rasps = list(timetable.keys())
+    state.rng.shuffle(rasps)
     for pot_rasp1 in rasps:
         if rasp0.id == pot_rasp1.id or timetable[rasp0] == timetable[pot_rasp1]:
             continue
@@ -236,9 +295,8 @@ def problematic_rasp_pair(state, tabu_list1, tabu_list2):
 def most_problematic_rasps(state, percent):
     timetable = state.timetable
     problematic_rasps = []
-    for rasp, old_slot in timetable.items():
-        if not is_rasp_problematic(state, rasp, old_slot.room_id):
-            continue
+    for rasp in list(state.conflict_registry.rasps):
+        old_slot = timetable[rasp]
         only_old_slot_grade = tax_tool.untax_old_slot(state, rasp, old_slot)
         tax_tool.tax_new_slot(state, rasp, old_slot)
         problematic_rasps.append((rasp, only_old_slot_grade["totalScore"]))
@@ -248,4 +306,3 @@ def most_problematic_rasps(state, percent):
     problematic_rasps = problematic_rasps[:num_keep]
     problematic_rasps = [ele[0] for ele in problematic_rasps]
     return problematic_rasps
-
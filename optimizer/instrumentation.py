@@ -0,0 +1,232 @@
+import json
+import time
+import optimizer.grade_tool           as grade_tool
+import optimizer.local_search         as local_search
+import optimizer.simulated_annealing  as simulated_annealing
+import optimizer.why_fail             as why_fail
+import optimizer.taxing.tax_rooms     as tax_rooms
+import optimizer.taxing.tax_sems      as tax_sems
+import optimizer.taxing.tax_profs     as tax_profs
+import optimizer.taxing.tax_capacity  as tax_capac
+import optimizer.taxing.tax_computers as tax_compu
+import optimizer.taxing.tax_groups    as tax_groups
+
+# Taxing functions timed per tax module (tax_tool calls them as module attributes)
+TAX_FUNCTIONS = {
+    "tax_rooms":  (tax_rooms,  ["tax_rrule_in_rooms", "untax_rrule_in_rooms"]),
+    "tax_sems":   (tax_sems,   ["tax_rrule_in_sems", "untax_rrule_in_sems"]),
+    "tax_profs":  (tax_profs,  ["tax_rrule_in_profs", "untax_rrule_in_profs"]),
+    "tax_capacity":  (tax_capac, ["tax_capacity", "untax_capacity"]),
+    "tax_computers": (tax_compu, ["tax_computers", "untax_computers"]),
+    "tax_groups": (tax_groups, ["tax_rrule_in_groups", "untax_rrule_in_groups"]),
+}
+
+# Descents over a rasp's slot pool, a descent is accepted if it returns a slot
+DESCENT_FUNCTIONS = [(local_search, "first_better_slot"), (local_search, "steepest_better_slot"),
+                     (simulated_annealing, "annealing_descent")]
+
+# Counters, tax seconds and stream of the current run (see enable)
+run = {"enabled": False}
+
+# Original functions replaced by enable, {(module, name) : function}
+originals = {}
+
+"""
+Turns instrumentation on for all optimizers of this process (until disable):
+    1) counts candidate slot evaluations (grade_tool.evaluate_move_batched),
+       why_fail.is_skippable checks and skips, descents and accepted descents,
+       and grade_tool.random_problematic_rasp calls
+    2) times every taxing module (tax_rooms, tax_sems, ...)
+    3) if stream_path is given, appends a JSONL sample of the last interval
+       seconds to it (checked whenever a problematic rasp is picked)
+Functions are replaced by counting wrappers only while enabled, so a disabled
+instrumentation costs nothing in the optimizers' loops.
+"""
+def enable(stream_path=None, interval=1.0):
+    if run["enabled"]:
+        disable()
+
+    run.update({"enabled": True, "start_time": time.perf_counter(), "interval": interval,
+                "stream": open(stream_path, "w", encoding="utf-8") if stream_path else None,
+                "counters": init_counters(), "tax_seconds": dict.fromkeys(TAX_FUNCTIONS, 0.0),
+                "problematic_rasps": None})
+    run["last_sample"] = get_sample_base()
+
+    patch(grade_tool, "evaluate_move_batched", counting_wrapper("evaluations"))
+    patch(grade_tool, "random_problematic_rasp", problematic_rasp_wrapper)
+    patch(why_fail, "is_skippable", skippable_wrapper)
+    for module, name in DESCENT_FUNCTIONS:
+        patch(module, name, descent_wrapper)
+    for tax_module_name, (module, names) in TAX_FUNCTIONS.items():
+        for name in names:
+            patch(module, name, timing_wrapper(tax_module_name))
+
+
+"""
+Restores the original functions, writes the summary to the stream (if any)
+and closes it. Returns the summary of the run (see get_summary).
+"""
+def disable():
+    if not run["enabled"]:
+        return None
+
+    for (module, name), function in originals.items():
+        setattr(module, name, function)
+    originals.clear()
+
+    summary = get_summary()
+    if run["stream"]:
+        write_record({"type": "summary", **summary})
+        run["stream"].close()
+    run.update({"enabled": False, "stream": None})
+    return summary
+
+
+"""
+Returns a dict of counter names set to 0.
+"""
+def init_counters():
+    return dict.fromkeys(["evaluations", "skip_checks", "skips", "descents", "accepted_descents",
+                          "problematic_rasp_calls"], 0)
+
+
+"""
+Replaces module.name with wrapper(original function), remembering the original.
+"""
+def patch(module, name, wrapper):
+    function = getattr(module, name)
+    originals[(module, name)] = function
+    setattr(module, name, wrapper(function))
+
+
+"""
+Returns a wrapper factory that counts calls in counters[counter_name].
+"""
+def counting_wrapper(counter_name):
+    def wrapper(function):
+        counters = run["counters"]
+        def counted(*args):
+            counters[counter_name] += 1
+            return function(*args)
+        return counted
+    return wrapper
+
+
+"""
+Wraps why_fail.is_skippable: counts checks and skipped slots.
+"""
+def skippable_wrapper(function):
+    counters = run["counters"]
+    def counted(slot, action):
+        skippable = function(slot, action)
+        counters["skip_checks"] += 1
+        counters["skips"] += skippable
+        return skippable
+    return counted
+
+
+"""
+Wraps a descent: counts descents and the ones that found a slot.
+"""
+def descent_wrapper(function):
+    counters = run["counters"]
+    def counted(*args):
+        new_slot = function(*args)
+        counters["descents"] += 1
+        counters["accepted_descents"] += new_slot is not None
+        return new_slot
+    return counted
+
+
+"""
+Wraps grade_tool.random_problematic_rasp: counts calls, keeps the number of
+problematic rasps and writes a stream sample every interval seconds.
+"""
+def problematic_rasp_wrapper(function):
+    counters = run["counters"]
+    def counted(state, tabu_list):
+        counters["problematic_rasp_calls"] += 1
+        run["problematic_rasps"] = len(state.conflict_registry.rasps)
+        if run["stream"] and time.perf_counter() - run["last_sample"]["time"] >= run["interval"]:
+            write_sample(state)
+        return function(state, tabu_list)
+    return counted
+
+
+"""
+Returns a wrapper factory that adds seconds spent in the function to tax_seconds[tax_module_name].
+"""
+def timing_wrapper(tax_module_name):
+    def wrapper(function):
+        tax_seconds = run["tax_seconds"]
+        def timed(*args):
+            start_time = time.perf_counter()
+            result = function(*args)
+            tax_seconds[tax_module_name] += time.perf_counter() - start_time
+            return result
+        return timed
+    return wrapper
+
+
+"""
+Returns the counters and tax seconds at this moment, the base of the next sample.
+"""
+def get_sample_base():
+    return {"time": time.perf_counter(), "counters": run["counters"].copy(), "tax_seconds": run["tax_seconds"].copy()}
+
+
+"""
+Returns rates of counters and tax_seconds gathered in seconds:
+evaluations per second, accept rate of descents, skip rate and time share of each tax module.
+"""
+def get_rates(counters, tax_seconds, seconds):
+    total_tax_seconds = sum(tax_seconds.values())
+    return {"evaluations_per_sec": counters["evaluations"] / seconds if seconds > 0 else 0.0,
+            "accept_rate": counters["accepted_descents"] / counters["descents"] if counters["descents"] else None,
+            "skip_rate":   counters["skips"] / counters["skip_checks"] if counters["skip_checks"] else None,
+            "tax_share":   {name : (spent / total_tax_seconds if total_tax_seconds else 0.0)
+                            for name, spent in tax_seconds.items()}}
+
+
+"""
+Appends a sample of the interval since the last sample to the stream:
+elapsed seconds, counter deltas, rates (see get_rates), problematic rasps and grade.
+"""
+def write_sample(state):
+    base, now = run["last_sample"], get_sample_base()
+    counters    = {name : count - base["counters"][name] for name, count in now["counters"].items()}
+    tax_seconds = {name : spent - base["tax_seconds"][name] for name, spent in now["tax_seconds"].items()}
+    write_record({"type": "sample", "elapsed": now["time"] - run["start_time"], **counters,
+                  **get_rates(counters, tax_seconds, now["time"] - base["time"]),
+                  "tax_seconds": tax_seconds, "problematic_rasps": run["problematic_rasps"],
+                  "totalScore": int(state.grade["totalScore"])})
+    run["last_sample"] = now
+
+
+def write_record(record):
+    run["stream"].write(json.dumps(record) + "\n")
+    run["stream"].flush()
+
+
+"""
+Returns the summary of the run so far: elapsed seconds, counters, rates (see get_rates),
+tax seconds and the last known number of problematic rasps.
+"""
+def get_summary():
+    elapsed = time.perf_counter() - run["start_time"]
+    return {"elapsed": elapsed, **run["counters"], **get_rates(run["counters"], run["tax_seconds"], elapsed),
+            "tax_seconds": run["tax_seconds"].copy(), "problematic_rasps": run["problematic_rasps"]}
+
+
+"""
+Prints a summary (see get_summary).
+"""
+def print_summary(summary):
+    rate = lambda value: "-" if value is None else f"{100 * value:.1f}%"
+    print(f"\nInstrumentation ({summary['elapsed']:.2f}s):")
+    print(f"    evaluations            {summary['evaluations']} ({summary['evaluations_per_sec']:.0f}/s)")
+    print(f"    skipped slots          {summary['skips']} of {summary['skip_checks']} ({rate(summary['skip_rate'])})")
+    print(f"    accepted descents      {summary['accepted_descents']} of {summary['descents']} ({rate(summary['accept_rate'])})")
+    print(f"    problematic rasp picks {summary['problematic_rasp_calls']} (last count: {summary['problematic_rasps']})")
+    for name, spent in summary["tax_seconds"].items():
+        print(f"    {name:<23}{spent:.3f}s ({rate(summary['tax_share'][name])})")
@@ -1,10 +1,10 @@
 import time
-import random
-from tqdm import tqdm
 import optimizer.grade_tool   as grade_tool
 import optimizer.tax_tool     as tax_tool
 import optimizer.rasp_slots   as rasp_slots
 import optimizer.why_fail     as why_fail
+import optimizer.progress     as progress
+import optimizer.tracker      as tracker
 from utilities.my_types import State
 
 
@@ -12,21 +12,21 @@ from utilities.my_types import State
 Loop where each iteration is an attempt to optimize the timetable grade.
 """
 def run(state, CPU_TIME_SEC, start_time):
-    print("Starting local search.")
-    print(0, state.grade)
+    progress.log("Starting local search.")
+    progress.log(0, state.grade)
 
     while True:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         found_better = find_better_neighbor(state, CPU_TIME_SEC, start_time)
 
         if state.grade["totalScore"] == 0:
-            print("Found 0 score solution.")
+            progress.log("Found 0 score solution.")
             break
         elif not found_better:
-            print("No 0 score solution.")
+            progress.log("No 0 score solution.")
             break
 
 
@@ -55,7 +55,7 @@ def find_better_neighbor(state: State, CPU_TIME_SEC, start_time):
 
     while not searched_entire_neighborhood:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         # Define a neighborhood (random problematic rasp)
@@ -83,9 +83,10 @@ def find_better_neighbor(state: State, CPU_TIME_SEC, start_time):
             # Tax the chosen slot
             new_slot = new_slot if new_slot else old_slot
             tax_tool.tax_new_slot(state, rasp0, new_slot)
+            tracker.tick(state, elapsed_time)
 
             if improvement:
-                tqdm.write(f"{round(elapsed_time, 2)}, {state.grade}")
+                progress.report(state, elapsed_time)
                 break
 
     return improvement
@@ -93,17 +94,16 @@ def find_better_neighbor(state: State, CPU_TIME_SEC, start_time):
 
 def first_better_slot(state, rasp0, only_old_slot_grade):
     action = why_fail.init_action()
-    pool_list = list(rasp_slots.get_rasp_slots(state, rasp0))
-    random.shuffle(pool_list)
+    pool_list = rasp_slots.get_rasp_slots(state, rasp0)
+    room_pool, position_grades = rasp_slots.get_room_pool(state, rasp0), {}
+    state.rng.shuffle(pool_list)
     for new_slot in pool_list:
         if why_fail.is_skippable(new_slot, action):
             continue
 
-        rasp_slots.update_rasp_rrules(state, new_slot, rasp0)
-
         # Calculate collisions if rasp0 would be on new slot
-        only_new_slot_grade = grade_tool.count_all_collisions(state, new_slot, rasp0)
-        got_better_score = only_new_slot_grade["totalScore"] > only_old_slot_grade["totalScore"]
+        only_new_slot_grade = grade_tool.evaluate_move_batched(state, rasp0, new_slot, room_pool, position_grades)
+        got_better_score = only_new_slot_grade.totalScore > only_old_slot_grade["totalScore"]
 
         if got_better_score:
             return new_slot
@@ -116,19 +116,18 @@ def first_better_slot(state, rasp0, only_old_slot_grade):
 def steepest_better_slot(state, rasp0, only_old_slot_grade):
     best_slot, best_grade = None, only_old_slot_grade.copy()
     action = why_fail.init_action()
-    pool_list = list(rasp_slots.get_rasp_slots(state, rasp0))
+    pool_list = rasp_slots.get_rasp_slots(state, rasp0)
+    room_pool, position_grades = rasp_slots.get_room_pool(state, rasp0), {}
     for new_slot in pool_list:
         if why_fail.is_skippable(new_slot, action):
             continue
 
-        rasp_slots.update_rasp_rrules(state, new_slot, rasp0)
-
         # Calculate collisions if rasp0 would be on new slot
-        only_new_slot_grade = grade_tool.count_all_collisions(state, new_slot, rasp0)
-        got_better_score = only_new_slot_grade["totalScore"] > best_grade["totalScore"]
+        only_new_slot_grade = grade_tool.evaluate_move_batched(state, rasp0, new_slot, room_pool, position_grades)
+        got_better_score = only_new_slot_grade.totalScore > best_grade["totalScore"]
 
         if got_better_score:
-            best_slot, best_grade = new_slot, only_new_slot_grade
+            best_slot, best_grade = new_slot, only_new_slot_grade._asdict()
             if best_grade["totalScore"] == 0:
                 break
         else:
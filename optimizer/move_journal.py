@@ -0,0 +1,101 @@
+import optimizer.tax_tool   as tax_tool
+import optimizer.rasp_slots as rasp_slots
+from utilities.my_types import MoveJournal
+
+# rasp_rrules fields that tax_tool.tax_new_slot/untax_old_slot overwrite
+RRULE_FIELDS = ["DTSTART", "UNTIL", "all_dates", "all_dates_idx"]
+
+"""
+Starts a tentative compound move of a State. Slots are then (un)taxed with
+move_journal.untax_old_slot/tax_new_slot, which record the values they overwrite,
+and the move is ended with commit (keep it) or rollback (undo it).
+"""
+def begin(state):
+    registry = state.conflict_registry
+    return MoveJournal(state.grade.copy(), registry.rasps[:], registry.positions.copy(), [])
+
+
+"""
+Same as tax_tool.untax_old_slot, recorded in journal.
+"""
+def untax_old_slot(state, journal, rasp, old_slot):
+    record_change(state, journal, rasp, old_slot.room_id, state.rasp_rrules[rasp.id]["all_dates_idx"])
+    return tax_tool.untax_old_slot(state, rasp, old_slot)
+
+
+"""
+Same as tax_tool.tax_new_slot, recorded in journal.
+"""
+def tax_new_slot(state, journal, rasp, new_slot):
+    record_change(state, journal, rasp, new_slot.room_id, rasp_slots.get_all_dates_index(state, rasp, new_slot))
+    tax_tool.tax_new_slot(state, rasp, new_slot)
+
+
+"""
+Keeps all changes recorded in journal.
+"""
+def commit(journal):
+    journal.changes.clear()
+
+
+"""
+Undoes all changes recorded in journal (newest first) by writing back the
+overwritten matrix cells, timetable slots and rasp_rrules paths, then restores
+the grade and problematic rasps from the start of the move.
+Nothing is re-taxed, so a rollback costs one scatter per recorded row.
+"""
+def rollback(state, journal):
+    timetable = state.timetable
+    registry  = state.conflict_registry
+
+    for rasp, in_timetable, slot, rrules, room_id, in_room, cells in reversed(journal.changes):
+        for row, all_dates_idx, values in cells:
+            row[all_dates_idx] = values
+        state.rasp_rrules[rasp.id].update(rrules)
+        if in_timetable:
+            timetable[rasp] = slot
+        else:
+            timetable.pop(rasp, None)
+        if in_room:
+            registry.room_rasps[room_id].add(rasp)
+        else:
+            registry.room_rasps[room_id].discard(rasp)
+
+    state.grade.update(journal.grade)
+    registry.rasps[:] = journal.problematic_rasps
+    registry.positions.clear()
+    registry.positions.update(journal.positions)
+    journal.changes.clear()
+
+
+"""
+Records what (un)taxing rasp along all_dates_idx in room_id is about to overwrite:
+timetable slot, rasp_rrules path, room_rasps membership and matrix cells.
+"""
+def record_change(state, journal, rasp, room_id, all_dates_idx):
+    rrules = state.rasp_rrules[rasp.id]
+    cells  = [(row, all_dates_idx, row[all_dates_idx].copy()) for row in get_taxed_rows(state, rasp, room_id)]
+    journal.changes.append((rasp, rasp in state.timetable, state.timetable.get(rasp),
+                            {field : rrules[field] for field in RRULE_FIELDS},
+                            room_id, rasp in state.conflict_registry.room_rasps[room_id], cells))
+
+
+"""
+Returns raveled views of all mutable constraint rows that taxing rasp in room_id changes
+(see tax_tool.tax_all_constraints).
+"""
+def get_taxed_rows(state, rasp, room_id):
+    constraints = state.mutable_constraints
+    index       = constraints.index
+    own_type    = str(rasp.subject_id) + str(rasp.type)
+
+    rows = [constraints.rooms_occupied[index.rooms[room_id]],
+            constraints.profs_occupied[index.profs[rasp.professor_id]],
+            constraints.groups_occupied[index.groups[own_type]],
+            constraints.subjects_occupied[index.subjects[rasp.subject_id]]]
+    for sem_id in rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids:
+        rows.append(constraints.sems_occupied[index.sems[sem_id]])
+        rows.append(constraints.sems_collisions[index.sems[sem_id]])
+    for sem_id in rasp.optional_in_semester_ids:
+        rows.append(constraints.optionals_occupied[index.optionals[sem_id]])
+    return [row.ravel() for row in rows]
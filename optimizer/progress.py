@@ -0,0 +1,54 @@
+import threading
+import optimizer.tracker as tracker
+from tqdm import tqdm
+
+# Improvement listener and stop event of the optimizer running in the current thread (see listen)
+listeners = threading.local()
+
+"""
+Makes optimizers running in the current thread:
+    1) call on_improvement(state, elapsed_time) instead of printing their
+       improvements, and print nothing else (no progress bars either)
+    2) stop as if CPU_TIME_SEC passed once stop_event (threading.Event) is set
+listen(None, None) restores printing and stopping on CPU_TIME_SEC only.
+"""
+def listen(on_improvement, stop_event):
+    listeners.on_improvement = on_improvement
+    listeners.stop_event     = stop_event
+
+
+"""
+Returns True if optimizers of the current thread are listened to (and shouldn't print).
+"""
+def is_quiet():
+    return getattr(listeners, "on_improvement", None) is not None
+
+
+"""
+Reports an improvement of state's grade: records it (see tracker.record) and passes
+it to the listener or prints it with the optimizer's parameters (e.g. temperature=...).
+The message is only formatted when it's printed.
+"""
+def report(state, elapsed_time, **parameters):
+    tracker.record(state, elapsed_time, parameters)
+    if is_quiet():
+        listeners.on_improvement(state, elapsed_time)
+    else:
+        details = [f"{name}={round(value, 1)}" for name, value in parameters.items()]
+        tqdm.write(", ".join([str(round(elapsed_time, 2)), *details, str(state.grade)]))
+
+
+"""
+Prints message unless optimizers of the current thread are listened to.
+"""
+def log(*message):
+    if not is_quiet():
+        print(*message)
+
+
+"""
+Returns True if an optimizer should stop: CPU_TIME_SEC passed or stop was requested.
+"""
+def is_time_over(elapsed_time, CPU_TIME_SEC):
+    stop_event = getattr(listeners, "stop_event", None)
+    return elapsed_time >= CPU_TIME_SEC or (stop_event is not None and stop_event.is_set())
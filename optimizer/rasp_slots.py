@@ -1,56 +1,206 @@
-from utilities.my_types import Slot
+import weakref
+import numpy as np
+from utilities.my_types import Slot, SlotDomain
 
-""" Returns Slot(room_id, week, day, hour) for given (week, day, hour).
+""" Returns a list of Slot(room_id, week, day, hour) for given (week, day, hour).
 """
 def get_possible_slots(state, rasp, week, day, hour = None):
-    rooms_occupied = state.mutable_constraints.rooms_occupied
     NUM_HOURS      = state.time_structure.NUM_HOURS
-
-    room_pool = set()
-    if rasp.fix_at_room_id:
-        room_pool = set([rasp.fix_at_room_id])
-    else:
-        room_pool = set(room_id for room_id in rooms_occupied)
+    room_pool      = get_room_pool(state, rasp)
 
     if hour != None: # hour=0 should trigger this if
-        return set([Slot(room_id, week, day, hour)
-                    for room_id in room_pool])
+        return [Slot(room_id, week, day, hour)
+                for room_id in room_pool]
     else:
-        return set([Slot(room_id, week, day, hr)
-                    for room_id in room_pool
-                    for hr in range(NUM_HOURS)
-                    if hr+rasp.duration < NUM_HOURS])
+        return [Slot(room_id, week, day, hr)
+                for room_id in room_pool
+                for hr in range(NUM_HOURS)
+                if hr+rasp.duration < NUM_HOURS]
 
 
 """
-Returns a set of possible starting Slot(room_id, week, day, hour)s for a rasp.
-Used later to pick DTSTART of rasp.
+Returns a list of room_ids that rasp can be placed in (its fixed room or all rooms).
 """
-def get_rasp_slots(state, rasp):
+def get_room_pool(state, rasp):
+    if rasp.fix_at_room_id:
+        return [rasp.fix_at_room_id]
+    return list(state.initial_constraints.index.rooms)
+
+
+"""
+Returns a list of unique possible starting Slot(room_id, week, day, hour)s for a rasp.
+Every slot allowed by rasp's rrule, rooms and fixed hour is included (see get_slot_domain).
+The order doesn't depend on hashing, so seeded runs (state.rng) are reproducible.
+"""
+def get_all_rasp_slots(state, rasp):
     rasp_rrules = state.rasp_rrules
-    pool = set()
+    pool = {}
     dtstart_weekdays = rasp_rrules[rasp.id]["dtstart_weekdays"]
     for given_week, given_day in dtstart_weekdays:
-        pool |= get_possible_slots(state, rasp, given_week, given_day, rasp.fixed_hour)
-    return pool
+        pool.update(dict.fromkeys(get_possible_slots(state, rasp, given_week, given_day, rasp.fixed_hour)))
+    return list(pool)
+
+
+# Slots of slot domains, built on first use by get_rasp_slots ({id(domain.slots) : tuple of Slots}),
+# an entry is removed when its domain is garbage collected
+domain_slots = {}
+
+"""
+Returns a new list of the starting Slots that optimizers pick for a rasp (rasp's slot domain).
+Used later to pick DTSTART of rasp.
+"""
+def get_rasp_slots(state, rasp):
+    domain = state.slot_domains[rasp.id]
+    key = id(domain.slots)
+    if key not in domain_slots:
+        weeks, days, hours = domain.positions[domain.slots[:, 1]].T.tolist()
+        room_ids = [domain.room_ids[row] for row in domain.slots[:, 0].tolist()]
+        domain_slots[key] = tuple(map(Slot, room_ids, weeks, days, hours))
+        weakref.finalize(domain.slots, domain_slots.pop, key, None)
+    return list(domain_slots[key])
+
+
+"""
+Returns a random Slot of rasp's slot domain, the same one as
+state.rng.choice(get_rasp_slots(state, rasp)) but without building the whole list.
+"""
+def random_rasp_slot(state, rasp):
+    domain = state.slot_domains[rasp.id]
+    return get_domain_slot(domain, state.rng.choice(range(len(domain.slots))))
+
+
+"""
+Returns the first k Slots of rasp's slot domain shuffled by state.rng, the same ones as
+state.rng.shuffle(get_rasp_slots(state, rasp))[:k] but without building the whole list.
+"""
+def sample_rasp_slots(state, rasp, k):
+    domain = state.slot_domains[rasp.id]
+    order  = list(range(len(domain.slots)))
+    state.rng.shuffle(order)
+    return [get_domain_slot(domain, i) for i in order[:k]]
+
+
+"""
+Returns the i-th Slot of a SlotDomain.
+"""
+def get_domain_slot(domain, i):
+    room_row, position = domain.slots[i].tolist()
+    week, day, hour    = domain.positions[position].tolist()
+    return Slot(domain.room_ids[room_row], week, day, hour)
+
+
+"""
+Returns {rasp.id : SlotDomain} for all rasps of a State (see get_slot_domain).
+"""
+def get_slot_domains(state):
+    rooms    = state.initial_constraints.index.rooms
+    room_ids = tuple(sorted(rooms, key=rooms.get))
+    return {rasp.id : get_slot_domain(state, rasp, room_ids) for rasp in state.rasps}
+
+
+"""
+Returns the SlotDomain of rasp's statically viable slots, the ones whose static penalty
+(see get_static_penalties) is 0, in the order of get_all_rasp_slots.
+If rasp has no such slot, all of its slots are kept, ranked from the
+best static penalty to the worst, so the rasp can still be placed.
+room_ids are the room ids of the State by their rows in initial_constraints.index.rooms.
+"""
+def get_slot_domain(state, rasp, room_ids):
+    room_pool, positions = get_domain_axes(state, rasp)
+    penalties = get_static_penalties(state, rasp, room_pool, positions)
+    room_rows = np.array([state.initial_constraints.index.rooms[room_id] for room_id in room_pool], dtype=np.int16)
+
+    # Slots in the order of get_all_rasp_slots: (week, day) first, then room, then hour
+    num_rooms, num_hours = len(room_rows), len(set(positions[:, 2].tolist()))
+    num_weekdays = len(positions) // num_hours if num_hours else 0
+    shape     = (num_rooms, num_weekdays, num_hours)
+    rooms     = np.broadcast_to(room_rows[:, None, None], shape)
+    position  = np.broadcast_to(np.arange(len(positions)).reshape(1, num_weekdays, num_hours), shape)
+    slots     = np.stack([rooms.transpose(1, 0, 2).ravel(), position.transpose(1, 0, 2).ravel()], axis=1).astype(np.int16)
+    penalties = penalties.reshape(shape).transpose(1, 0, 2).ravel()
+
+    if (penalties == 0).any():
+        return SlotDomain(room_ids, positions, slots[penalties == 0])
+    return SlotDomain(room_ids, positions, slots[np.argsort(-penalties, kind="stable")])
+
+
+"""
+Returns (room_pool, positions) of rasp's slots:
+    1) room_pool -> its room ids (see get_room_pool)
+    2) positions -> np.int16 array of unique starting (week, day, hour)s allowed by
+                    rasp's rrule and fixed hour, (week, day) first, then hour
+"""
+def get_domain_axes(state, rasp):
+    NUM_HOURS = state.time_structure.NUM_HOURS
+    hours    = [rasp.fixed_hour] if rasp.fixed_hour != None else [hr for hr in range(NUM_HOURS) if hr + rasp.duration < NUM_HOURS]
+    weekdays = dict.fromkeys(state.rasp_rrules[rasp.id]["dtstart_weekdays"])
+    positions = np.array([(week, day, hour) for week, day in weekdays for hour in hours], dtype=np.int16).reshape(-1, 3)
+    return get_room_pool(state, rasp), positions
+
+
+"""
+Returns an np.array (rooms x positions) of static penalties of rasp placed
+in each of room_pool at each of positions (see get_domain_axes).
+Static penalties don't depend on the timetable (same -30 scoring as grade_tool):
+    1) room collisions with the room's initial constraints (room not available)
+    2) professor collisions with professor's initial constraints (professor not available)
+    3) capacity and computer problems of the room
+all_dates paths of the positions are padded to one matrix (with an index of an always
+free date), so the collisions of all rooms at all positions are summed with one gather.
+"""
+def get_static_penalties(state, rasp, room_pool, positions):
+    initial   = state.initial_constraints
+    room_rows = [initial.index.rooms[room_id] for room_id in room_pool]
+    students  = state.students_per_rasp[rasp.id]
+    rooms     = state.rooms
+
+    paths = [get_all_dates_index(state, rasp, Slot(None, week, day, hour)) for week, day, hour in positions.tolist()]
+    free_date = initial.rooms_occupied[0].size
+    all_dates_idx = np.full((len(paths), max(map(len, paths), default=0)), free_date, dtype=np.intp)
+    for i, path in enumerate(paths):
+        all_dates_idx[i, :len(path)] = path
+
+    rooms_occupied = initial.rooms_occupied[room_rows].reshape(len(room_rows), -1)
+    rooms_occupied = np.concatenate([rooms_occupied, np.zeros((len(room_rows), 1), dtype=rooms_occupied.dtype)], axis=1)
+    prof_occupied  = np.append(initial.profs_occupied[initial.index.profs[rasp.professor_id]].ravel(), 0)
+    collisions = rooms_occupied[:, all_dates_idx].sum(axis=2, dtype=np.int64) + \
+                 prof_occupied[all_dates_idx].sum(axis=1, dtype=np.int64)
+
+    room_problems = np.array([int(students - rooms[room_id].capacity > 0) +
+                              int(not rooms[room_id].has_computers and rasp.needs_computers)
+                              for room_id in room_pool], dtype=np.int64)
+    # A date occupied in initial constraints becomes a count of 2 (see grade_tool.count_rrule_in_matrix3D)
+    return -30 * (2 * collisions + room_problems[:, None])
 
 
 """
-Updates rasp's DTSTART, UNTIL and all_dates to new values.
+Returns (all_dates, all_dates_idx) of a rasp placed at a given slot.
+Both are shared read-only references into state.rrule_dates and must not be changed.
+"""
+def get_slot_dates(state, rasp, slot):
+    index = state.rasp_rrules[rasp.id]["rrule_table_index"]
+    return state.rrule_dates[(index, slot.week, slot.day, slot.hour, rasp.duration)]
+
+
+"""
+Returns the all_dates path of a rasp placed at a given slot as a flat np.intp array
+(see time_api.dates_to_flat_index). Reads rrule_dates only and does not change state.
+"""
+def get_all_dates_index(state, rasp, slot):
+    return get_slot_dates(state, rasp, slot)[1]
+
+
+"""
+Updates rasp's DTSTART, UNTIL, all_dates and all_dates_idx to new values.
 """
 def update_rasp_rrules(state, slot, rasp):
     rasp_rrules = state.rasp_rrules
-    rrule_table = state.rrule_table
 
-    index = rasp_rrules[rasp.id]["rrule_table_index"]
-    key = (slot.week, slot.day)
-    rrule_table_element = rrule_table[index][key]
-    all_dates = [(week, day, hour)
-                 for week, day in rrule_table_element
-                 for hour in range(slot.hour, slot.hour + rasp.duration)]
+    all_dates, all_dates_idx = get_slot_dates(state, rasp, slot)
     rasp_rrules[rasp.id]["DTSTART"] = all_dates[0]
     rasp_rrules[rasp.id]["UNTIL"] = all_dates[-1]
     rasp_rrules[rasp.id]["all_dates"] = all_dates
+    rasp_rrules[rasp.id]["all_dates_idx"] = all_dates_idx
 
 
 def clear_rasp_rrules(state, rasp):
@@ -59,6 +209,7 @@ def clear_rasp_rrules(state, rasp):
     rasp_rrules[rasp.id]["DTSTART"] = None
     rasp_rrules[rasp.id]["UNTIL"] = None
     rasp_rrules[rasp.id]["all_dates"] = []
+    rasp_rrules[rasp.id]["all_dates_idx"] = np.empty(0, dtype=np.intp)
 
 
 """
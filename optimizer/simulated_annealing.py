@@ -1,11 +1,11 @@
 import time
 import math
-import random
-from tqdm import tqdm
 import optimizer.grade_tool as grade_tool
 import optimizer.tax_tool   as tax_tool
 import optimizer.rasp_slots as rasp_slots
 import optimizer.why_fail   as why_fail
+import optimizer.progress   as progress
+import optimizer.tracker    as tracker
 from utilities.my_types import State
 
 
@@ -13,23 +13,23 @@ from utilities.my_types import State
 Loop where each iteration is an attempt to optimize the timetable grade.
 """
 def run(state, temperature, CPU_TIME_SEC, start_time):
-    print(0, state.grade)
+    progress.log(0, state.grade)
 
     iteration = 0
     while True:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         temp = temperature / (iteration+1)
         local_optima = next_neighbor(state, temp, CPU_TIME_SEC, start_time)
 
         if state.grade["totalScore"] == 0:
-            print("Found 0 score solution.")
+            progress.log("Found 0 score solution.")
             return
 
         elif local_optima:
-            print("No 0 score solution.")
+            progress.log("No 0 score solution.")
             return
 
         iteration += 1
@@ -44,7 +44,7 @@ def next_neighbor(state: State, temperature, CPU_TIME_SEC, start_time):
     old_total = state.grade["totalScore"]
     while not searched_entire_neighborhood:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         # Define a neighborhood (random problematic rasp)
@@ -68,12 +68,13 @@ def next_neighbor(state: State, temperature, CPU_TIME_SEC, start_time):
         # Tax the chosen slot
         new_slot = new_slot if new_slot else old_slot
         tax_tool.tax_new_slot(state, rasp0, new_slot)
+        tracker.tick(state, elapsed_time, temperature=temperature)
 
         new_total = state.grade["totalScore"]
         improvement = True if new_total > old_total else False
 
         if improvement:
-            tqdm.write(f"{round(elapsed_time, 2)}, {round(temperature, 1)}, {state.grade}")
+            progress.report(state, elapsed_time, temperature=temperature)
             break
 
     return local_optima
@@ -81,20 +82,19 @@ def next_neighbor(state: State, temperature, CPU_TIME_SEC, start_time):
 
 def annealing_descent(state, rasp0, only_old_slot_grade, temperature):
     action = why_fail.init_action()
-    pool_list = list(rasp_slots.get_rasp_slots(state, rasp0))
-    random.shuffle(pool_list)
+    pool_list = rasp_slots.get_rasp_slots(state, rasp0)
+    room_pool, position_grades = rasp_slots.get_room_pool(state, rasp0), {}
+    state.rng.shuffle(pool_list)
     for new_slot in pool_list:
         if why_fail.is_skippable(new_slot, action):
             continue
 
-        rasp_slots.update_rasp_rrules(state, new_slot, rasp0)
-
         # Calculate collisions if rasp0 would be on new slot
-        only_new_slot_grade = grade_tool.count_all_collisions(state, new_slot, rasp0)
+        only_new_slot_grade = grade_tool.evaluate_move_batched(state, rasp0, new_slot, room_pool, position_grades)
         old = only_old_slot_grade["totalScore"]
-        new = only_new_slot_grade["totalScore"]
+        new = only_new_slot_grade.totalScore
 
-        if P(old, new, temperature) >= random.random():
+        if P(old, new, temperature) >= state.rng.random():
             return new_slot
         else:
             why_fail.failure_reason(action, new_slot, only_new_slot_grade, only_old_slot_grade)
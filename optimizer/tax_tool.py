@@ -3,12 +3,16 @@ import optimizer.taxing.tax_sems      as tax_sems
 import optimizer.taxing.tax_profs     as tax_profs
 import optimizer.taxing.tax_capacity  as tax_capac
 import optimizer.taxing.tax_computers as tax_compu
+import optimizer.taxing.tax_groups    as tax_groups
 import optimizer.rasp_slots           as rasp_slots
+import optimizer.conflict_registry    as conflict_registry
 
 """
 Taxes:
     1) rasp's all_dates path in rooms, professors, and sems (semesters).
     2) rasp's capacity and computers problem.
+    3) rasp's all_dates path in groups (last, because sems taxing expects
+       the rasp itself not to be in groups_occupied).
 """
 def tax_all_constraints(state, slot, rasp):
     tax_rooms.tax_rrule_in_rooms(state, slot.room_id, rasp)
@@ -16,13 +20,16 @@ def tax_all_constraints(state, slot, rasp):
     tax_sems.tax_rrule_in_sems(state, rasp)
     tax_capac.tax_capacity(state, slot.room_id, rasp)
     tax_compu.tax_computers(state, slot.room_id, rasp)
+    tax_groups.tax_rrule_in_groups(state, rasp)
 
 """
 Untaxes:
-    1) rasp's all_dates path in rooms, professors, and sems (semesters).
-    2) rasp's capacity and computers problem.
+    1) rasp's all_dates path in groups (first, see tax_all_constraints).
+    2) rasp's all_dates path in rooms, professors, and sems (semesters).
+    3) rasp's capacity and computers problem.
 """
 def untax_all_constraints(state, slot, rasp):
+    tax_groups.untax_rrule_in_groups(state, rasp)
     tax_rooms.untax_rrule_in_rooms(state, slot.room_id, rasp)
     tax_profs.untax_rrule_in_profs(state, rasp)
     tax_sems.untax_rrule_in_sems(state, rasp)
@@ -30,20 +37,32 @@ def untax_all_constraints(state, slot, rasp):
     tax_compu.untax_computers(state, slot.room_id, rasp)
 
 
+"""
+Places rasp at new_slot: taxes its constraints, puts it in the timetable
+and updates the conflict registry.
+"""
 def tax_new_slot(state, rasp, new_slot):
     timetable = state.timetable
     rasp_slots.update_rasp_rrules(state, new_slot, rasp)
     tax_all_constraints(state, new_slot, rasp)
     timetable[rasp] = new_slot
+    conflict_registry.update_after_tax(state, rasp, new_slot)
 
 
+"""
+Removes rasp from old_slot: untaxes its constraints, takes it out of the timetable
+and updates the conflict registry.
+Returns the grade that rasp had at old_slot.
+"""
 def untax_old_slot(state, rasp, old_slot):
     grade = state.grade
     grade_with_old_slot = grade.copy()
+    all_dates_idx = state.rasp_rrules[rasp.id]["all_dates_idx"]
     untax_all_constraints(state, old_slot, rasp)
     grade_without_old_slot = grade.copy()
     only_old_slot_grade = {k:grade_with_old_slot[k] - grade_without_old_slot[k] for k in grade_with_old_slot}
     rasp_slots.clear_rasp_rrules(state, rasp)
     state.timetable[rasp] = None
+    conflict_registry.update_after_untax(state, rasp, old_slot, all_dates_idx)
     return only_old_slot_grade
 
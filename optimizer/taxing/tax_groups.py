@@ -0,0 +1,28 @@
+"""
+Marks the rasp's all dates path in groups_occupied (its type) and subjects_occupied (its subject).
+Used to keep track of where parallel groups and other types of a subject are taxed.
+"""
+def tax_rrule_in_groups(state, rasp):
+    all_dates_idx    = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    own_type         = str(rasp.subject_id) + str(rasp.type)
+    index            = state.mutable_constraints.index
+    group_occupied   = state.mutable_constraints.groups_occupied[index.groups[own_type]].ravel()
+    subject_occupied = state.mutable_constraints.subjects_occupied[index.subjects[rasp.subject_id]].ravel()
+
+    group_occupied[all_dates_idx] += 1
+    subject_occupied[all_dates_idx] += 1
+
+
+"""
+Unmarks the rasp's all dates path in groups_occupied and subjects_occupied.
+Used to undo the previous tax.
+"""
+def untax_rrule_in_groups(state, rasp):
+    all_dates_idx    = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    own_type         = str(rasp.subject_id) + str(rasp.type)
+    index            = state.mutable_constraints.index
+    group_occupied   = state.mutable_constraints.groups_occupied[index.groups[own_type]].ravel()
+    subject_occupied = state.mutable_constraints.subjects_occupied[index.subjects[rasp.subject_id]].ravel()
+
+    group_occupied[all_dates_idx] -= 1
+    subject_occupied[all_dates_idx] -= 1
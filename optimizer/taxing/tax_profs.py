@@ -1,14 +1,17 @@
+import numpy as np
+
 """
 Detects professor collisions along the rasp's all dates path and taxes them.
+All weeks of the path are counted with one gather and one scatter (dates of a path are unique).
 """
 def tax_rrule_in_profs(state, rasp):
-    all_dates     = state.rasp_rrules[rasp.id]["all_dates"]
-    prof_occupied = state.mutable_constraints.profs_occupied[rasp.professor_id]
+    all_dates_idx = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    prof_row      = state.mutable_constraints.index.profs[rasp.professor_id]
+    prof_occupied = state.mutable_constraints.profs_occupied[prof_row].ravel()
 
-    cnt = 0
-    for week, day, hour in all_dates:
-        prof_occupied[week, day, hour] += 1
-        cnt += prof_occupied[week, day, hour] if prof_occupied[week, day, hour]>1 else 0
+    new_counts = prof_occupied[all_dates_idx].astype(np.int64) + 1
+    prof_occupied[all_dates_idx] = new_counts
+    cnt = int(new_counts[new_counts > 1].sum())
     if cnt:
         punish = -cnt*30
         update_grade_profs(state, punish, plus=True)
@@ -19,13 +22,13 @@ Detects professor collisions along the rasp's all dates path and untaxes them.
 Used to undo the previous tax.
 """
 def untax_rrule_in_profs(state, rasp):
-    all_dates     = state.rasp_rrules[rasp.id]["all_dates"]
-    prof_occupied = state.mutable_constraints.profs_occupied[rasp.professor_id]
+    all_dates_idx = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    prof_row      = state.mutable_constraints.index.profs[rasp.professor_id]
+    prof_occupied = state.mutable_constraints.profs_occupied[prof_row].ravel()
 
-    cnt = 0
-    for week, day, hour in all_dates:
-        cnt += prof_occupied[week, day, hour] if prof_occupied[week, day, hour]>1 else 0
-        prof_occupied[week, day, hour] -= 1
+    old_counts = prof_occupied[all_dates_idx].astype(np.int64)
+    prof_occupied[all_dates_idx] = old_counts - 1
+    cnt = int(old_counts[old_counts > 1].sum())
 
     if cnt:
         punish = -cnt*30
@@ -44,4 +47,3 @@ def update_grade_profs(state, punish, plus=True):
     else:
         grade["professorScore"] -= punish
         grade["totalScore"] -= punish
-
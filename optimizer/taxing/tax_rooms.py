@@ -1,14 +1,17 @@
+import numpy as np
+
 """
 Detects room collisions along the rasp's all dates path and taxes them.
+All weeks of the path are counted with one gather and one scatter (dates of a path are unique).
 """
 def tax_rrule_in_rooms(state, room_id, rasp):
-    all_dates      = state.rasp_rrules[rasp.id]["all_dates"]
-    room_occupied  = state.mutable_constraints.rooms_occupied[room_id]
+    all_dates_idx  = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    room_row       = state.mutable_constraints.index.rooms[room_id]
+    room_occupied  = state.mutable_constraints.rooms_occupied[room_row].ravel()
 
-    cnt = 0
-    for week, day, hour in all_dates:
-        room_occupied[week, day, hour] += 1
-        cnt += room_occupied[week, day, hour] if room_occupied[week, day, hour] > 1 else 0
+    new_counts = room_occupied[all_dates_idx].astype(np.int64) + 1
+    room_occupied[all_dates_idx] = new_counts
+    cnt = int(new_counts[new_counts > 1].sum())
     if cnt:
         punish = -cnt*30
         update_grade_rooms(state, punish, plus=True)
@@ -19,13 +22,13 @@ Detects room collisions along the rasp's all dates path and untaxes them.
 Used to undo the previous tax.
 """
 def untax_rrule_in_rooms(state, room_id, rasp):
-    all_dates      = state.rasp_rrules[rasp.id]["all_dates"]
-    room_occupied  = state.mutable_constraints.rooms_occupied[room_id]
+    all_dates_idx  = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    room_row       = state.mutable_constraints.index.rooms[room_id]
+    room_occupied  = state.mutable_constraints.rooms_occupied[room_row].ravel()
 
-    cnt = 0
-    for week, day, hour in all_dates:
-        cnt += room_occupied[week, day, hour] if room_occupied[week, day, hour] > 1 else 0
-        room_occupied[week, day, hour] -= 1
+    old_counts = room_occupied[all_dates_idx].astype(np.int64)
+    room_occupied[all_dates_idx] = old_counts - 1
+    cnt = int(old_counts[old_counts > 1].sum())
     if cnt:
         punish = -cnt*30
         update_grade_rooms(state, punish, plus=False)
@@ -42,4 +45,3 @@ def update_grade_rooms(state, punish, plus=True):
     else:
         grade["roomScore"] -= punish
         grade["totalScore"] -= punish
-
@@ -1,3 +1,4 @@
+import numpy as np
 import data_api.constraints as cons_api
 
 """
@@ -37,22 +38,20 @@ Detects semester collisions along the mandatory rasp's all dates path and taxes
 It does NOT tax parallel mandatory groups.
 """
 def tax_rrule_in_sems_mandatory(state, sem_id, rasp):
-    all_dates       = state.rasp_rrules[rasp.id]["all_dates"]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
+    all_dates_idx   = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    sem_row         = state.mutable_constraints.index.sems[sem_id]
+    sem_occupied    = state.mutable_constraints.sems_occupied[sem_row].ravel()
+    sem_collisions  = state.mutable_constraints.sems_collisions[sem_row].ravel()
 
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
 
-        # If (week, day, hour) is not taken by a group (allow parallel groups)
-        if (week, day, hour) not in own_group_dates:
-            sem_collisions[week, day, hour] += 1
-
-        new_cnt_colls = sem_collisions[week, day, hour]
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
-        sem_occupied[week, day, hour] += 1
+    # If (week, day, hour) is not taken by a group (allow parallel groups)
+    not_own_group = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx)
+    new_cnt_colls = old_cnt_colls + not_own_group
+    punish = sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
+    sem_collisions[all_dates_idx] = new_cnt_colls
+    sem_occupied[all_dates_idx] = old_cnt_occ + 1
 
     if punish:
         update_grade_sems(state, punish, plus=True)
@@ -63,21 +62,19 @@ Detects semester collisions along the mandatory rasp's all dates path and untaxe
 It does NOT untax parallel groups.
 """
 def untax_rrule_in_sems_mandatory(state, sem_id, rasp):
-    all_dates       = state.rasp_rrules[rasp.id]["all_dates"]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
-
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
+    all_dates_idx   = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    sem_row         = state.mutable_constraints.index.sems[sem_id]
+    sem_occupied    = state.mutable_constraints.sems_occupied[sem_row].ravel()
+    sem_collisions  = state.mutable_constraints.sems_collisions[sem_row].ravel()
 
-        if (week, day, hour) not in own_group_dates:
-            sem_collisions[week, day, hour] -= 1
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
 
-        new_cnt_colls = sem_collisions[week, day, hour]
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ-1, new_cnt_colls)
-        sem_occupied[week, day, hour] -= 1
+    not_own_group = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx)
+    new_cnt_colls = old_cnt_colls - not_own_group
+    punish = sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ-1, new_cnt_colls)
+    sem_collisions[all_dates_idx] = new_cnt_colls
+    sem_occupied[all_dates_idx] = old_cnt_occ - 1
 
     if punish:
         update_grade_sems(state, punish, plus=False)
@@ -88,24 +85,22 @@ Detects semester collisions along the optional rasp's all dates path and taxes t
 It does NOT tax parallel optionals.
 """
 def tax_rrule_in_sems_optional(state, sem_id, rasp):
-    all_dates = state.rasp_rrules[rasp.id]["all_dates"]
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    other_groups_dates = cons_api.get_other_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    optional_occupied = state.mutable_constraints.optionals_occupied[sem_id]
-    sem_collisions  = state.mutable_constraints.sems_collisions[sem_id]
-
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
-
-        if not (week, day, hour) in own_group_dates and (optional_occupied[week, day, hour] == 0 or (week, day, hour) in other_groups_dates):
-            sem_collisions[week, day, hour] += 1
-
-        new_cnt_colls = sem_collisions[week, day, hour]
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
-        sem_occupied[week, day, hour] += 1
-        optional_occupied[week, day, hour] += 1
+    all_dates_idx     = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    index             = state.mutable_constraints.index
+    sem_occupied      = state.mutable_constraints.sems_occupied[index.sems[sem_id]].ravel()
+    optional_occupied = state.mutable_constraints.optionals_occupied[index.optionals[sem_id]].ravel()
+    sem_collisions    = state.mutable_constraints.sems_collisions[index.sems[sem_id]].ravel()
+
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
+
+    collides = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx) & \
+               ((optional_occupied[all_dates_idx] == 0) | cons_api.in_other_groups_dates(state, rasp, all_dates_idx))
+    new_cnt_colls = old_cnt_colls + collides
+    punish = sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ+1, new_cnt_colls)
+    sem_collisions[all_dates_idx] = new_cnt_colls
+    sem_occupied[all_dates_idx] = old_cnt_occ + 1
+    optional_occupied[all_dates_idx] += 1
 
     if punish:
         update_grade_sems(state, punish, plus=True)
@@ -116,33 +111,36 @@ Detects semester collisions along the optional rasp's all dates path and untaxes
 It does NOT untax parallel optionals.
 """
 def untax_rrule_in_sems_optional(state, sem_id, rasp):
-    own_group_dates = cons_api.get_own_groups_all_dates(state, rasp)
-    all_dates = state.rasp_rrules[rasp.id]["all_dates"]
-    other_groups_dates = cons_api.get_other_groups_all_dates(state, rasp)
-    sem_occupied    = state.mutable_constraints.sems_occupied[sem_id]
-    optionals_occupied = state.mutable_constraints.optionals_occupied[sem_id]
-    sem_collisions = state.mutable_constraints.sems_collisions[sem_id]
-
-    punish = 0
-    for week, day, hour in all_dates:
-        old_cnt_occ, old_cnt_colls = sem_occupied[week, day, hour], sem_collisions[week, day, hour]
-
-        if (week, day, hour) not in own_group_dates and (optionals_occupied[week, day, hour] == 1 or (week, day, hour) in other_groups_dates):
-            sem_collisions[week, day, hour] -= 1
-
-        new_cnt_colls = sem_collisions[week, day, hour]
-        punish += sems_tax_punish(old_cnt_occ, old_cnt_colls, old_cnt_occ-1, new_cnt_colls)
-        sem_occupied[week, day, hour] -= 1
-        optionals_occupied[week, day, hour] -= 1
+    all_dates_idx      = state.rasp_rrules[rasp.id]["all_dates_idx"]
+    index              = state.mutable_constraints.index
+    sem_occupied       = state.mutable_constraints.sems_occupied[index.sems[sem_id]].ravel()
+    optionals_occupied = state.mutable_constraints.optionals_occupied[index.optionals[sem_id]].ravel()
+    sem_collisions     = state.mutable_constraints.sems_collisions[index.sems[sem_id]].ravel()
+
+    old_cnt_occ   = sem_occupied[all_dates_idx].astype(np.int64)
+    old_cnt_colls = sem_collisions[all_dates_idx].astype(np.int64)
+
+    collides = ~cons_api.in_own_groups_dates(state, rasp, all_dates_idx) & \
+               ((optionals_occupied[all_dates_idx] == 1) | cons_api.in_other_groups_dates(state, rasp, all_dates_idx))
+    new_cnt_colls = old_cnt_colls - collides
+    punish = sems_tax_punish_array(old_cnt_occ, old_cnt_colls, old_cnt_occ-1, new_cnt_colls)
+    sem_collisions[all_dates_idx] = new_cnt_colls
+    sem_occupied[all_dates_idx] = old_cnt_occ - 1
+    optionals_occupied[all_dates_idx] -= 1
 
     if punish:
         update_grade_sems(state, punish, plus=False)
 
 
-def sems_tax_punish(old_cnt_occ, old_cnt_colls, new_cnt_occ, new_cnt_colls):
-    old_score = 0 if old_cnt_colls <= 1  else old_cnt_occ * -30
-    new_score = 0 if new_cnt_colls <= 1  else new_cnt_occ * -30
-    return -abs(old_score - new_score)
+"""
+Returns the summed punish of all dates of a taxing change. Takes int64 arrays
+(one element per date): a date scores occupied count * -30 while it has more than
+one collision, punish is the difference between the old and the new score.
+"""
+def sems_tax_punish_array(old_cnt_occ, old_cnt_colls, new_cnt_occ, new_cnt_colls):
+    old_score = np.where(old_cnt_colls <= 1, 0, old_cnt_occ * -30)
+    new_score = np.where(new_cnt_colls <= 1, 0, new_cnt_occ * -30)
+    return -int(np.abs(old_score - new_score).sum())
 
 
 """
@@ -0,0 +1,160 @@
+import os
+import csv
+import json
+import threading
+import numpy as np
+from utilities.my_types import ConvergenceTracker
+
+# Convergence tracker of the optimizer running in the current thread (see start)
+trackers = threading.local()
+
+# Recorded grade scores (totalScore first, the other columns are its components)
+GRADE_NAMES = ["totalScore", "roomScore", "professorScore", "capacityScore", "computerScore", "semScore"]
+
+# Recorded optimizer parameters (nan where an optimizer doesn't have it)
+PARAMETER_NAMES = ["neighbor_k", "neighbor_l", "temperature"]
+
+# Default number of records kept, older records are overwritten by newer ones
+CAPACITY = 100_000
+
+"""
+Starts recording the convergence of optimizers running in the current thread
+(until stop) and returns the ConvergenceTracker. Records are made:
+    1) on every improvement reported to progress.report
+    2) on the first tick after every interval seconds (see tick)
+Only the last capacity records are kept.
+"""
+def start(algo_name, interval=1.0, capacity=CAPACITY):
+    tracker = ConvergenceTracker(algo_name, interval, 0.0, 0, 0,
+                                 np.zeros(capacity, dtype=np.float64),
+                                 np.zeros(capacity, dtype=np.int64),
+                                 np.zeros((capacity, len(GRADE_NAMES)), dtype=np.int64),
+                                 np.full((capacity, len(PARAMETER_NAMES)), np.nan),
+                                 np.zeros(capacity, dtype=bool))
+    trackers.current = tracker
+    return tracker
+
+
+"""
+Stops recording in the current thread. Returns the ConvergenceTracker (None if none was started).
+"""
+def stop():
+    tracker = getattr(trackers, "current", None)
+    trackers.current = None
+    return tracker
+
+
+"""
+Counts one iteration of the optimizer running in the current thread and records
+state's grade if interval seconds passed since the last sample.
+parameters are the optimizer's current parameters (see PARAMETER_NAMES).
+"""
+def tick(state, elapsed_time, **parameters):
+    tracker = getattr(trackers, "current", None)
+    if tracker is None:
+        return
+    tracker.iteration += 1
+    if elapsed_time >= tracker.next_sample:
+        tracker.next_sample = elapsed_time + tracker.interval
+        add_record(tracker, state, elapsed_time, parameters, False)
+
+
+"""
+Records an improvement of state's grade (called by progress.report).
+"""
+def record(state, elapsed_time, parameters):
+    tracker = getattr(trackers, "current", None)
+    if tracker is not None:
+        add_record(tracker, state, elapsed_time, parameters, True)
+
+
+def add_record(tracker, state, elapsed_time, parameters, improvement):
+    i = tracker.count % len(tracker.elapsed)
+    tracker.elapsed[i]      = elapsed_time
+    tracker.iterations[i]   = tracker.iteration
+    tracker.scores[i]       = [state.grade[name] for name in GRADE_NAMES]
+    tracker.parameters[i]   = [parameters.get(name, np.nan) for name in PARAMETER_NAMES]
+    tracker.improvements[i] = improvement
+    tracker.count += 1
+
+
+"""
+Returns (elapsed, iterations, scores, parameters, improvements) of the kept records
+in the order they were made.
+"""
+def get_records(tracker):
+    capacity = len(tracker.elapsed)
+    if tracker.count <= capacity:
+        order = np.arange(tracker.count)
+    else:
+        order = np.roll(np.arange(capacity), -(tracker.count % capacity))
+    return (tracker.elapsed[order], tracker.iterations[order], tracker.scores[order],
+            tracker.parameters[order], tracker.improvements[order])
+
+
+"""
+Returns the indices of records (see get_records) that improve the best totalScore so far,
+the best-so-far curve of a run (restarts that are worse than the best don't appear in it).
+"""
+def get_best_so_far(scores):
+    best_so_far = np.maximum.accumulate(scores[:, 0])
+    return np.flatnonzero(np.diff(best_so_far, prepend=np.iinfo(np.int64).min) > 0)
+
+
+"""
+Returns the records of tracker in the format of the C++ optimizer's tracker
+(cpp_optimizer/common/save_tracker_to_json.cpp):
+    1) "<algo>_times" and "<algo>_scores" -> the best-so-far totalScore curve (see get_best_so_far),
+       with "<algo>_iterations" and a list per grade component (e.g. "<algo>_roomScore") of the same records
+    2) "<algo>_sample_..." -> every kept record (times, scores, iterations, improvements, grade components
+       and used parameters, e.g. "<algo>_sample_temperature"), the current grades of the run
+"""
+def to_tracker_json(tracker):
+    elapsed, iterations, scores, parameters, improvements = get_records(tracker)
+    name = tracker.algo_name
+    best = get_best_so_far(scores)
+    tracker_js = {f"{name}_times": elapsed[best].tolist(), f"{name}_scores": scores[best, 0].tolist(),
+                  f"{name}_iterations": iterations[best].tolist()}
+    for j, grade_name in enumerate(GRADE_NAMES[1:], start=1):
+        tracker_js[f"{name}_{grade_name}"] = scores[best, j].tolist()
+
+    tracker_js.update({f"{name}_sample_times": elapsed.tolist(), f"{name}_sample_scores": scores[:, 0].tolist(),
+                       f"{name}_sample_iterations": iterations.tolist(),
+                       f"{name}_sample_improvements": improvements.tolist()})
+    for j, grade_name in enumerate(GRADE_NAMES[1:], start=1):
+        tracker_js[f"{name}_sample_{grade_name}"] = scores[:, j].tolist()
+    for j, parameter_name in enumerate(PARAMETER_NAMES):
+        if not np.isnan(parameters[:, j]).all():
+            tracker_js[f"{name}_sample_{parameter_name}"] = [None if np.isnan(value) else value for value in parameters[:, j].tolist()]
+    return tracker_js
+
+
+"""
+Saves the records of tracker to path:
+    1) .csv  -> one row per record (elapsed, iteration, improvement, grade scores, parameters)
+    2) other -> JSON of to_tracker_json, merged into the file if it exists,
+                so runs of several algorithms end up in one tracker file
+"""
+def save(tracker, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".csv"):
+        save_csv(tracker, path)
+        return
+
+    tracker_js = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            tracker_js = json.load(f)
+    tracker_js.update(to_tracker_json(tracker))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tracker_js, f, indent=3)
+
+
+def save_csv(tracker, path):
+    elapsed, iterations, scores, parameters, improvements = get_records(tracker)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["elapsed", "iteration", "improvement", *GRADE_NAMES, *PARAMETER_NAMES])
+        for i in range(len(elapsed)):
+            row_parameters = ["" if np.isnan(value) else value for value in parameters[i].tolist()]
+            writer.writerow([elapsed[i], iterations[i], int(improvements[i]), *scores[i].tolist(), *row_parameters])
@@ -1,20 +1,26 @@
 import time
-import random
-from tqdm import tqdm
 import optimizer.grade_tool   as grade_tool
 import optimizer.tax_tool     as tax_tool
 import optimizer.local_search as local_search
 import optimizer.rasp_slots   as rasp_slots
+import optimizer.progress     as progress
+import optimizer.tracker      as tracker
+import optimizer.move_journal as journal_api
+import data_api.solution      as solution_api
 from utilities.my_types import State
 
 
+"""
+Shakes the timetable and descends (VND) until no neighborhood k improves the grade.
+state is left with the best timetable that was found.
+"""
 def run(state, CPU_TIME_SEC, start_time):
     neighbor_k, k_max = 1,2
-    best_grade, best_state = state.grade.copy(), state
+    best_grade, best_solution = state.grade.copy(), solution_api.snapshot(state)
 
     while neighbor_k <= k_max:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         shake(state, neighbor_k)
@@ -24,8 +30,8 @@ def run(state, CPU_TIME_SEC, start_time):
         if improvement:
             neighbor_k = 1
             best_grade = state.grade.copy()
-            best_state = state
-            tqdm.write(f"{round(elapsed_time,2)}, {neighbor_k=}, {best_grade}")
+            best_solution = solution_api.snapshot(state)
+            progress.report(state, elapsed_time, neighbor_k=neighbor_k)
         else:
             neighbor_k += 1
 
@@ -33,7 +39,8 @@ def run(state, CPU_TIME_SEC, start_time):
         if perfect_grade:
             break
 
-    state = best_state
+    if state.grade["totalScore"] < best_grade["totalScore"]:
+        solution_api.restore(state, best_solution)
 
 
 """
@@ -46,12 +53,12 @@ Theory idea: Intensify/Deintensify the shaking.
 """
 def shake(state, neighbor_k):
     timetable = state.timetable
-    print(f"Shaking {neighbor_k}")
+    progress.log(f"Shaking {neighbor_k}")
 
     if neighbor_k == 1:
-        rasp0 = random.choice(list(timetable.keys()))
+        rasp0 = state.rng.choice(list(timetable.keys()))
         tax_tool.untax_old_slot(state, rasp0, timetable[rasp0])
-        rnd_slot = random.choice(list(rasp_slots.get_rasp_slots(state, rasp0)))
+        rnd_slot = rasp_slots.random_rasp_slot(state, rasp0)
         tax_tool.tax_new_slot(state, rasp0, rnd_slot)
     elif neighbor_k == 2:
         rasp0, rasp1 = grade_tool.problematic_rasp_pair(state, set(), set())
@@ -74,16 +81,17 @@ def variable_neighborhood_descent(state: State, CPU_TIME_SEC, start_time):
     improvement = True
     while neighbor_l <= l_max:
         elapsed_time = time.time() - start_time
-        if elapsed_time >= CPU_TIME_SEC:
+        if progress.is_time_over(elapsed_time, CPU_TIME_SEC):
             break
 
         if neighbor_l == 1:
             improvement = vnd_neighborhood_1(state)
         if neighbor_l == 2:
             improvement = vnd_neighborhood_2(state)
+        tracker.tick(state, elapsed_time, neighbor_l=neighbor_l)
 
         if improvement:
-            tqdm.write(f"{round(elapsed_time, 2)}, {neighbor_l}, {state.grade}")
+            progress.report(state, elapsed_time, neighbor_l=neighbor_l)
 
         neighbor_l = 1 if improvement else neighbor_l+1
 
@@ -161,6 +169,11 @@ def vnd_neighborhood_2(state):
     return improvement
 
 
+"""
+Tries to place rasp0 into rasp1's slot and rasp1 into any of its other slots.
+The swap is a tentative move (see move_journal): it's committed if the grade
+improved and rolled back otherwise.
+"""
 def swap_pairs(state, rasp0, rasp1):
     timetable = state.timetable
     old_total_grade = state.grade.copy()
@@ -168,17 +181,16 @@ def swap_pairs(state, rasp0, rasp1):
     rasp0_old_slot, rasp1_old_slot = timetable[rasp0], timetable[rasp1]
 
     # Remove rasp0 from its slot, remove rasp1 from its slot. Place rasp0 into rasp1's slot.
-    tax_tool.untax_old_slot(state, rasp0, rasp0_old_slot)
-    tax_tool.tax_new_slot(state, rasp0, rasp1_old_slot)
-    tax_tool.untax_old_slot(state, rasp1, rasp1_old_slot)
+    journal = journal_api.begin(state)
+    journal_api.untax_old_slot(state, journal, rasp0, rasp0_old_slot)
+    journal_api.tax_new_slot(state, journal, rasp0, rasp1_old_slot)
+    journal_api.untax_old_slot(state, journal, rasp1, rasp1_old_slot)
 
     # If the score worsened just by moving rasp0 to rasp1's slot then set
     # rasp0 and rasp1 back to their original slots and return. Keep in mind
     # that rasp1 isn't even taxed at this point.
     if state.grade["totalScore"] <= old_total_grade["totalScore"]:
-        tax_tool.tax_new_slot(state, rasp1, rasp1_old_slot)
-        tax_tool.untax_old_slot(state, rasp0, rasp1_old_slot)
-        tax_tool.tax_new_slot(state, rasp0, rasp0_old_slot)
+        journal_api.rollback(state, journal)
         return False
 
     # Grade without rasp1 taxed.
@@ -192,13 +204,12 @@ def swap_pairs(state, rasp0, rasp1):
 
     # If slot is found, then tax it.
     if chosen_slot:
-        tax_tool.tax_new_slot(state, rasp1, chosen_slot)
+        journal_api.tax_new_slot(state, journal, rasp1, chosen_slot)
+        journal_api.commit(journal)
 
     # Otherwise set rasp0 and rasp1 back to their original slots.
     else:
-        tax_tool.tax_new_slot(state, rasp1, rasp1_old_slot)
-        tax_tool.untax_old_slot(state, rasp0, rasp1_old_slot)
-        tax_tool.tax_new_slot(state, rasp0, rasp0_old_slot)
+        journal_api.rollback(state, journal)
 
     return True if chosen_slot else False
 
@@ -8,15 +8,16 @@ def init_action():
 
 """
 Updates action object with knowledge gained from new slot grade and old slot grade.
+only_new_slot_grade is a GradeDelta (grade_tool.evaluate_move), only_old_slot_grade a grade dict.
 E.g. if professor + sem grade is worse than the old total grade then we can skip
      that slot in the future because it will have the same problem.
 """
 def failure_reason(action, slot, only_new_slot_grade, only_old_slot_grade):
     old_total     = only_old_slot_grade["totalScore"]
-    new_professor = only_new_slot_grade["professorScore"]
-    new_sem       = only_new_slot_grade["semScore"]
-    new_capacity  = only_new_slot_grade["capacityScore"]
-    new_computer  = only_new_slot_grade["computerScore"]
+    new_professor = only_new_slot_grade.professorScore
+    new_sem       = only_new_slot_grade.semScore
+    new_capacity  = only_new_slot_grade.capacityScore
+    new_computer  = only_new_slot_grade.computerScore
     room_id, week, day, hr = slot
     ban_slot = (week, day, hr)
 
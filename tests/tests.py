@@ -3,15 +3,25 @@ import data_api.time_structure as time_api
 from collections import defaultdict
 from dateutil.rrule import rrulestr
 from utilities.general_utilities import load_state, print_size
-from utilities.my_types import State, MutableConstraints
+from utilities.my_types import State
 from optimizer import tax_tool
 import optimizer.grade_tool as grade_tool
 import data_api.constraints as cons_api
+import data_api.occupancy_bits as bits_api
 import optimizer.rasp_slots as rasp_slots
+import data_api.solution as solution_api
 
 state = load_state()
 #print_size(state)
 
+"""
+Returns {id : matrix3D} of a constraints family (e.g. "rooms_occupied" with "rooms" index).
+"""
+def family_dict(constraints, family, index_name):
+    matrices = getattr(constraints, family)
+    return {key : matrices[row] for key, row in getattr(constraints.index, index_name).items()}
+
+
 """
 Tests if timetable constraints was properly taxed.
 1) Initial constraints are reconstructed
@@ -33,25 +43,13 @@ def timetable_properly_taxed(state):
     comp_grade        = state.grade["computerScore"]
     total_grade       = state.grade["totalScore"]
 
-    init_rooms_occupied     = {k:v.copy() for k,v in state.initial_constraints.rooms_occupied.items()}
-    init_profs_occupied     = {k:v.copy() for k,v in state.initial_constraints.profs_occupied.items()}
-    init_sems_occupied      = {k:v.copy() for k,v in state.initial_constraints.sems_occupied.items()}
-    init_optionals_occupied = {k:v.copy() for k,v in state.initial_constraints.optionals_occupied.items()}
-    init_sems_collisions    = {k:v.copy() for k,v in state.initial_constraints.sems_collisions.items()}
-
-    test_mutable_constraints = MutableConstraints(init_rooms_occupied, init_profs_occupied,
-                                                  init_sems_occupied, init_optionals_occupied,
-                                                  init_sems_collisions)
+    test_mutable_constraints = cons_api.get_mutable_constraints(state.initial_constraints)
 
     test_state = State(state.is_winter, state.semesters, state.time_structure, state.rasps,
                        state.rooms, state.students_per_rasp, state.initial_constraints,
                        state.groups, state.subject_types,
                        test_mutable_constraints, state.timetable, grade_tool.init_grade(rasps),
-                       state.rasp_rrules, state.rrule_table)
-
-    # rasp_rrules[all_dates] is already set to parallel groups so the tax algo will read wrong
-    for rasp in timetable:
-        test_state.rasp_rrules[rasp.id]["all_dates"] = []
+                       state.rasp_rrules, state.rrule_table, state.rrule_dates, None, state.rng, state.slot_domains)
 
     for rasp, slot in timetable.items():
         rasp_slots.update_rasp_rrules(test_state, slot, rasp)
@@ -70,8 +68,8 @@ def timetable_properly_taxed(state):
         #if comp_grade == 0 and rooms[slot.room_id].has_computers and not rasp.needs_computers:
         #    print(f"{rasp.id} has a weak computer problem at {slot}.")
 
-    given_rooms_occupied = state.mutable_constraints.rooms_occupied
-    calc_rooms_occupied  = test_state.mutable_constraints.rooms_occupied
+    given_rooms_occupied = family_dict(state.mutable_constraints, "rooms_occupied", "rooms")
+    calc_rooms_occupied  = family_dict(test_state.mutable_constraints, "rooms_occupied", "rooms")
     for room_id in calc_rooms_occupied:
         for week in range(NUM_WEEKS):
             for day in range(NUM_DAYS):
@@ -83,8 +81,8 @@ def timetable_properly_taxed(state):
                         print(f"calculated is: ", calc_rooms_occupied[room_id][week, day, hour])
                         print(f"given is: ", given_rooms_occupied[room_id][week, day, hour])
 
-    given_profs_occupied = state.mutable_constraints.profs_occupied
-    calc_profs_occupied  = test_state.mutable_constraints.profs_occupied
+    given_profs_occupied = family_dict(state.mutable_constraints, "profs_occupied", "profs")
+    calc_profs_occupied  = family_dict(test_state.mutable_constraints, "profs_occupied", "profs")
     prof_ids = set([rasp.professor_id for rasp in timetable])
     for prof_id in prof_ids:
         for week in range(NUM_WEEKS):
@@ -97,8 +95,8 @@ def timetable_properly_taxed(state):
                         print(f"calculated is: ", calc_profs_occupied[prof_id][week, day, hour])
                         print(f"given is: ", given_profs_occupied[prof_id][week, day, hour])
 
-    given_sems_collisions = state.mutable_constraints.sems_collisions
-    calc_sems_collisions  = test_state.mutable_constraints.sems_collisions
+    given_sems_collisions = family_dict(state.mutable_constraints, "sems_collisions", "sems")
+    calc_sems_collisions  = family_dict(test_state.mutable_constraints, "sems_collisions", "sems")
     all_sem_ids = set(sem_id for rasp in timetable for sem_id in rasp.mandatory_in_semester_ids + rasp.optional_in_semester_ids)
     for sem_id in all_sem_ids:
         for week in range(NUM_WEEKS):
@@ -111,6 +109,18 @@ def timetable_properly_taxed(state):
                         print(f"calculated is: ", calc_sems_collisions[sem_id][week, day, hour])
                         print(f"given is: ", given_sems_collisions[sem_id][week, day, hour])
 
+    given_groups_occupied = family_dict(state.mutable_constraints, "groups_occupied", "groups")
+    calc_groups_occupied  = family_dict(test_state.mutable_constraints, "groups_occupied", "groups")
+    for type_key in calc_groups_occupied:
+        if not np.array_equal(calc_groups_occupied[type_key], given_groups_occupied[type_key]):
+            print(f"{type_key} is not the same in given and calculated 'groups_occupied'.")
+
+    given_subjects_occupied = family_dict(state.mutable_constraints, "subjects_occupied", "subjects")
+    calc_subjects_occupied  = family_dict(test_state.mutable_constraints, "subjects_occupied", "subjects")
+    for subject_id in calc_subjects_occupied:
+        if not np.array_equal(calc_subjects_occupied[subject_id], given_subjects_occupied[subject_id]):
+            print(f"{subject_id} is not the same in given and calculated 'subjects_occupied'.")
+
     if sem_grade == 0:
         no_mandatory_optional_collisions(state)
         no_subject_type_collisions(state)
@@ -311,6 +321,64 @@ def correct_rooms(state):
             print(f"{rasp.id} has rasp.fix_at_room_id = {rasp.fix_at_room_id} and slot.room_id = {slot.room_id} | NOT EQUAL.")
 
 
+"""
+Tests if the conflict registry holds exactly the rasps that are problematic
+when the whole timetable is scanned.
+"""
+def correct_conflict_registry(state):
+    registry = state.conflict_registry
+    problematic = set(rasp for rasp, slot in state.timetable.items()
+                      if grade_tool.is_rasp_problematic(state, rasp, slot.room_id))
+    registered  = set(registry.rasps)
+
+    for rasp in problematic - registered:
+        print(f"{rasp.id} is problematic but not in conflict registry.")
+    for rasp in registered - problematic:
+        print(f"{rasp.id} is in conflict registry but not problematic.")
+    for rasp, position in registry.positions.items():
+        if registry.rasps[position] != rasp:
+            print(f"{rasp.id} has wrong conflict registry position {position}.")
+
+
+"""
+Tests if occupancy bits of mutable constraints have a bit set exactly where
+the count is >= 1 (occupied) and >= 2 (overflow).
+"""
+def correct_occupancy_bits(state):
+    constraints = state.mutable_constraints
+    bits        = bits_api.get_occupancy_bits(constraints)
+    NUM_HOURS   = state.time_structure.NUM_HOURS
+    hour_bits   = np.left_shift(np.uint64(1), np.arange(NUM_HOURS, dtype=np.uint64))
+
+    for masks, min_count in [(bits.occupied, 1), (bits.overflow, 2)]:
+        for family, index_name in [("rooms_occupied", "rooms"), ("profs_occupied", "profs"), ("sems_collisions", "sems")]:
+            for key, matrix3D in family_dict(constraints, family, index_name).items():
+                mask_bits = (family_dict(masks, family, index_name)[key][..., None] & hour_bits) != 0
+                if not np.array_equal(mask_bits, matrix3D >= min_count):
+                    print(f"{key} has wrong {family} occupancy bits (count >= {min_count}).")
+
+
+"""
+Tests if restoring a snapshot of the timetable rebuilds the same
+mutable constraints, grade, timetable and problematic rasps.
+"""
+def correct_solution_restore(state):
+    solution = solution_api.snapshot(state)
+    packed   = state.mutable_constraints.packed.copy()
+    problematic_rasps = set(state.conflict_registry.rasps)
+    timetable = dict(state.timetable)
+
+    solution_api.restore(state, solution)
+    if not np.array_equal(packed, state.mutable_constraints.packed):
+        print("Restored solution has wrong mutable constraints.")
+    if state.grade != solution.grade:
+        print(f"Restored solution has grade {state.grade} instead of {solution.grade}.")
+    if state.timetable != timetable:
+        print("Restored solution has a different timetable.")
+    if set(state.conflict_registry.rasps) != problematic_rasps:
+        print("Restored solution has different problematic rasps.")
+
+
 
 all_rasps_have_dates(state)
 all_dates_correct_start(state)
@@ -318,3 +386,6 @@ correct_rrules(state)
 correct_rooms(state)
 timetable_properly_taxed(state)
 all_rasps_in_timetable(state)
+correct_conflict_registry(state)
+correct_occupancy_bits(state)
+correct_solution_restore(state)
@@ -1,6 +1,11 @@
 import json
 import pickle
+import random
 import numpy as np
+import data_api.time_structure as time_api
+import data_api.constraints    as cons_api
+import optimizer.conflict_registry as conflict_registry
+import optimizer.rasp_slots        as rasp_slots
 from utilities.my_types import Semester, Timeblock, TimeStructure, Rasp, Classroom, InitialConstraints, MutableConstraints, Slot, State
 from datetime import datetime
 
@@ -81,7 +86,11 @@ def json_to_pickle(json_path, pickle_path):
     optionals_occupied = typed_dict_3Darray(state["initial_constraints"]["optionals_occupied"])
     sems_collisions    = typed_dict_3Darray(state["initial_constraints"]["sems_collisions"])
 
-    initial_constraints = InitialConstraints(rooms_occupied, profs_occupied, sems_occupied, optionals_occupied, sems_collisions)
+    #groups_occupied and subjects_occupied aren't saved in .json, they are rebuilt from the timetable
+    groups_occupied, subjects_occupied = cons_api.get_groups_occupied(NUM_WEEKS, NUM_DAYS, NUM_HOURS, rasps)
+
+    initial_constraints = cons_api.pack_constraints(InitialConstraints, [rooms_occupied, profs_occupied, sems_occupied, optionals_occupied,
+                                                                         sems_collisions, groups_occupied, subjects_occupied])
 
     #mutable_constraints
     rooms_occupied     = typed_dict_3Darray(state["mutable_constraints"]["rooms_occupied"])
@@ -90,7 +99,8 @@ def json_to_pickle(json_path, pickle_path):
     optionals_occupied = typed_dict_3Darray(state["mutable_constraints"]["optionals_occupied"])
     sems_collisions    = typed_dict_3Darray(state["mutable_constraints"]["sems_collisions"])
 
-    mutable_constraints = MutableConstraints(rooms_occupied, profs_occupied, sems_occupied, optionals_occupied, sems_collisions)
+    mutable_constraints = cons_api.pack_constraints(MutableConstraints, [rooms_occupied, profs_occupied, sems_occupied, optionals_occupied,
+                                                                         sems_collisions, groups_occupied, subjects_occupied])
 
     #groups
     groups = {key : set(value) for key, value in state["groups"].items()}
@@ -111,11 +121,13 @@ def json_to_pickle(json_path, pickle_path):
     #rasp rrules {rasp_id : RaspRRULES}
     rasp_rrules = {}
     for rasp_id, the_rasp_rrules in state["rasp_rrules"].items():
+        all_dates = [(week, day, hour) for week, day, hour in the_rasp_rrules["all_dates"]]
         typed_rasp_rrule = {
                 "DTSTART": tuple(the_rasp_rrules["DTSTART"]),
                 "UNTIL":   tuple(the_rasp_rrules["UNTIL"]),
                 "FREQ": the_rasp_rrules["FREQ"],
-                "all_dates": [(week, day, hour) for week, day, hour in the_rasp_rrules["all_dates"]],
+                "all_dates": all_dates,
+                "all_dates_idx": time_api.dates_to_flat_index(all_dates, time_structure),
                 "dtstart_weekdays": [(week, day) for week, day in the_rasp_rrules["dtstart_weekdays"]],
                 "rrule_table_index": the_rasp_rrules["rrule_table_index"]
         }
@@ -134,12 +146,45 @@ def json_to_pickle(json_path, pickle_path):
             typed_element[key_tuple] = [(week, day) for week, day in all_dates]
         rrule_table.append(typed_element)
 
-    new_state = State(is_winter, semesters, time_structure, rasps, rooms, students_per_rasp, initial_constraints, groups, subject_types, mutable_constraints, timetable, grade, rasp_rrules, rrule_table)
+    #rrule_dates [{"key": [rrule_table_index, week, day, hour, duration], "all_dates": [...]}, ...]
+    #C++ optimizer doesn't write rrule_dates back so in that case they are rebuilt from rrule_table.
+    if "rrule_dates" in state:
+        rrule_dates = {}
+        for element in state["rrule_dates"]:
+            all_dates = tuple((week, day, hour) for week, day, hour in element["all_dates"])
+            all_dates_idx = time_api.dates_to_flat_index(all_dates, time_structure)
+            all_dates_idx.flags.writeable = False
+            rrule_dates[tuple(element["key"])] = (all_dates, all_dates_idx)
+    else:
+        rrule_dates = time_api.get_rrule_dates_table(rasps, rasp_rrules, rrule_table, time_structure)
+
+    for rasp_id, typed_rasp_rrule in rasp_rrules.items():
+        index = typed_rasp_rrule["rrule_table_index"]
+        rasp = rasp_dict[rasp_id]
+        if rasp in timetable:
+            slot = timetable[rasp]
+            typed_rasp_rrule["all_dates"], typed_rasp_rrule["all_dates_idx"] = rrule_dates[(index, slot.week, slot.day, slot.hour, rasp.duration)]
+            own_type = str(rasp.subject_id) + str(rasp.type)
+            group_row   = mutable_constraints.index.groups[own_type]
+            subject_row = mutable_constraints.index.subjects[rasp.subject_id]
+            mutable_constraints.groups_occupied[group_row].ravel()[typed_rasp_rrule["all_dates_idx"]] += 1
+            mutable_constraints.subjects_occupied[subject_row].ravel()[typed_rasp_rrule["all_dates_idx"]] += 1
+
+    new_state = State(is_winter, semesters, time_structure, rasps, rooms, students_per_rasp, initial_constraints, groups, subject_types, mutable_constraints, timetable, grade, rasp_rrules, rrule_table, rrule_dates, None, random.Random(), None)
+    new_state.conflict_registry = conflict_registry.get_conflict_registry(new_state)
+    new_state.slot_domains = rasp_slots.get_slot_domains(new_state)
 
     with open(pickle_path, "wb") as p:
         pickle.dump(new_state, p)
 
 
+"""
+Returns {id : 3D list} of a packed constraints family (C++ optimizer reads constraints by id).
+"""
+def family_to_json(family, family_index):
+    return {key : family[row].tolist() for key, row in family_index.items()}
+
+
 def pickle_to_json(pickle_path, json_path):
     with open(pickle_path, "rb") as f:
         state = pickle.load(f)
@@ -156,19 +201,19 @@ def pickle_to_json(pickle_path, json_path):
     }
 
     initial_constraints = {
-        "rooms_occupied"     : {room_id : matrix3D.tolist() for room_id, matrix3D in state.initial_constraints.rooms_occupied.items()},
-        "profs_occupied"     : {prof_id : matrix3D.tolist() for prof_id, matrix3D in state.initial_constraints.profs_occupied.items()},
-        "sems_occupied"      : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.initial_constraints.sems_occupied.items()},
-        "optionals_occupied" : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.initial_constraints.optionals_occupied.items()},
-        "sems_collisions"    : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.initial_constraints.sems_collisions.items()}
+        "rooms_occupied"     : family_to_json(state.initial_constraints.rooms_occupied,     state.initial_constraints.index.rooms),
+        "profs_occupied"     : family_to_json(state.initial_constraints.profs_occupied,     state.initial_constraints.index.profs),
+        "sems_occupied"      : family_to_json(state.initial_constraints.sems_occupied,      state.initial_constraints.index.sems),
+        "optionals_occupied" : family_to_json(state.initial_constraints.optionals_occupied, state.initial_constraints.index.optionals),
+        "sems_collisions"    : family_to_json(state.initial_constraints.sems_collisions,    state.initial_constraints.index.sems)
     }
 
     mutable_constraints = {
-        "rooms_occupied"     : {room_id : matrix3D.tolist() for room_id, matrix3D in state.mutable_constraints.rooms_occupied.items()},
-        "profs_occupied"     : {prof_id : matrix3D.tolist() for prof_id, matrix3D in state.mutable_constraints.profs_occupied.items()},
-        "sems_occupied"      : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.mutable_constraints.sems_occupied.items()},
-        "optionals_occupied" : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.mutable_constraints.optionals_occupied.items()},
-        "sems_collisions"    : {sem_id  : matrix3D.tolist() for sem_id, matrix3D  in state.mutable_constraints.sems_collisions.items()}
+        "rooms_occupied"     : family_to_json(state.mutable_constraints.rooms_occupied,     state.mutable_constraints.index.rooms),
+        "profs_occupied"     : family_to_json(state.mutable_constraints.profs_occupied,     state.mutable_constraints.index.profs),
+        "sems_occupied"      : family_to_json(state.mutable_constraints.sems_occupied,      state.mutable_constraints.index.sems),
+        "optionals_occupied" : family_to_json(state.mutable_constraints.optionals_occupied, state.mutable_constraints.index.optionals),
+        "sems_collisions"    : family_to_json(state.mutable_constraints.sems_collisions,    state.mutable_constraints.index.sems)
     }
 
     rrule_table = []
@@ -181,6 +226,12 @@ def pickle_to_json(pickle_path, json_path):
     for key, val in state.grade.items():
         state.grade[key] = int(val)
 
+    rasp_rrules = {}
+    for rasp_id, rasp_rrule in state.rasp_rrules.items():
+        rasp_rrules[rasp_id] = {key: value for key, value in rasp_rrule.items() if key != "all_dates_idx"}
+
+    rrule_dates = [{"key": list(key), "all_dates": all_dates} for key, (all_dates, _) in state.rrule_dates.items()]
+
     state_json = {
             "is_winter": state.is_winter,
             "semesters": {sem_id : sem._asdict() for sem_id, sem in state.semesters.items()},
@@ -194,8 +245,9 @@ def pickle_to_json(pickle_path, json_path):
             "subject_types": {id_ : list(type_set) for id_, type_set in state.subject_types.items()},
             "timetable": {rasp.id : slot._asdict() for rasp, slot in state.timetable.items()},
             "grade": state.grade,
-            "rasp_rrules": state.rasp_rrules,
-            "rrule_table": rrule_table
+            "rasp_rrules": rasp_rrules,
+            "rrule_table": rrule_table,
+            "rrule_dates": rrule_dates
     }
 
     with open(json_path, "w", encoding="utf-8") as f:
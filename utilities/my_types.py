@@ -17,20 +17,66 @@ Professor = namedtuple('Professor', ['id', 'name'])
 Timeblock = namedtuple('Timeblock', ['index', 'timeblock'])
 Slot = namedtuple('Slot', ['room_id', 'week', 'day', 'hour'])
 
+# Starting slots of a rasp (see rasp_slots.get_slot_domain): room_ids by their rows in
+# initial_constraints.index.rooms, positions is an np.int16 array of (week, day, hour)s
+# and slots[i] = (room row, row of positions)
+SlotDomain = namedtuple('SlotDomain', ['room_ids', 'positions', 'slots'])
+
+# Score change of placing one rasp at one slot (same keys as State.grade)
+GradeDelta = namedtuple('GradeDelta', ['totalScore', 'roomScore', 'professorScore',
+                                       'capacityScore', 'computerScore', 'semScore'])
+
 # STATE parts
 TimeStructure = namedtuple('TimeStructure', ['START_SEMESTER_DATE', 'END_SEMESTER_DATE',
                                              'NUM_WEEKS', 'NUM_DAYS', 'NUM_HOURS',
                                              'timeblocks', 'hour_to_index', 'index_to_hour'])
 
+# Each family is a (num_entities, NUM_WEEKS, NUM_DAYS, NUM_HOURS) slice of one packed array,
+# index maps entity ids to rows (see cons_api.pack_constraints)
+ConstraintsIndex = namedtuple('ConstraintsIndex', ['rooms', 'profs', 'sems', 'optionals', 'groups', 'subjects'])
 InitialConstraints = namedtuple('InitialConstraints', ['rooms_occupied', 'profs_occupied',
-                                                       'sems_occupied', 'optionals_occupied', 'sems_collisions'])
+                                                       'sems_occupied', 'optionals_occupied', 'sems_collisions',
+                                                       'groups_occupied', 'subjects_occupied', 'index', 'packed'])
 MutableConstraints = namedtuple('MutableConstraints', ['rooms_occupied', 'profs_occupied',
-                                                       'sems_occupied', 'optionals_occupied', 'sems_collisions'])
+                                                       'sems_occupied', 'optionals_occupied', 'sems_collisions',
+                                                       'groups_occupied', 'subjects_occupied', 'index', 'packed'])
+
+# Constraints as np.uint64 hour masks of shape (num_entities, NUM_WEEKS, NUM_DAYS): bit h is set
+# when hour h has count >= 1 (occupied) or count >= 2 (overflow), see bits_api.get_occupancy_bits
+OccupancyBits = namedtuple('OccupancyBits', ['occupied', 'overflow'])
+
+# Room capacities in ascending order and their room ids (see availability.get_rooms_by_capacity)
+RoomsByCapacity = namedtuple('RoomsByCapacity', ['capacities', 'room_ids'])
+
+# free[i, day, hour] is True if rasp can start at (dtstart_weeks[day], day, hour) in room_ids[i]
+# without collisions, dtstart_weeks[day] is -1 for days that rasp can't start on (see movement/availability.py)
+AvailabilityMap = namedtuple('AvailabilityMap', ['room_ids', 'dtstart_weeks', 'free'])
 
 RaspRRULES = namedtuple('RaspRRULES', ["DTSTART", "UNTIL", "FREQ",
-                                       "all_dates", "dtstart_weekdays",
+                                       "all_dates", "all_dates_idx", "dtstart_weekdays",
                                        "rrule_table_index"])
 
+# Compact timetable of a State (see data_api/solution.py): slots[i] = (room row, week, day, hour)
+# of state.rasps[i] (-1s if not placed) and the grade of the timetable
+Solution = namedtuple('Solution', ['slots', 'grade'])
+
+# Best timetable found so far by algorithms.optimize: {rasp.id : Slot} and its grade
+Snapshot = namedtuple('Snapshot', ['elapsed_time', 'grade', 'timetable'])
+
+# Changes of a tentative compound move (see optimizer/move_journal.py): grade and problematic
+# rasps before the move, and one record per untaxed/taxed slot with the values it overwrote
+MoveJournal = namedtuple('MoveJournal', ['grade', 'problematic_rasps', 'positions', 'changes'])
+
+# Ring buffer of convergence records of one optimizer run (see optimizer/tracker.py):
+# count records were made, the last len(elapsed) of them are kept at position (record number % len(elapsed))
+ConvergenceTracker = recordclass('ConvergenceTracker', ['algo_name', 'interval', 'next_sample',
+                                                        'iteration', 'count', 'elapsed', 'iterations',
+                                                        'scores', 'parameters', 'improvements'])
+
+# Problematic rasps of a timetable (see optimizer/conflict_registry.py)
+ConflictRegistry = recordclass('ConflictRegistry', ['rasps', 'positions',
+                                                    'room_rasps', 'prof_rasps', 'sem_rasps'])
+
 # STATE
 State = recordclass('State',  ['is_winter','semesters',
                               'time_structure', 'rasps',
@@ -39,4 +85,6 @@ State = recordclass('State',  ['is_winter','semesters',
                               'groups', 'subject_types',
                               'mutable_constraints',
                               'timetable', 'grade',
-                              'rasp_rrules', 'rrule_table'])
+                              'rasp_rrules', 'rrule_table',
+                              'rrule_dates', 'conflict_registry', 'rng',
+                              'slot_domains'])
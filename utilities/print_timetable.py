@@ -51,13 +51,13 @@ def get_print_table(week_matrix, NUM_DAYS, NUM_HOURS, by_prof_id="", by_room_id=
 
 
 """
-Prints the timetable in stdout.
+Prints the timetable of state (the saved State by default) to output_path.
 3 timetable views are printed:
 - by rooms, by profs, and by semesters
-Can be redirected to a .txt file.
 """
-def run():
-    state = load_state()
+def run(state=None, output_path="timetable.txt"):
+    if state is None:
+        state = load_state()
     timetable = state.timetable
     rasp_rrules = state.rasp_rrules
     rasps = timetable.keys()
@@ -79,7 +79,7 @@ def run():
         for week, day, hour in all_dates:
             schedule_matrix[week, day, hour].append(show_object)
 
-    f = open("timetable.txt", "w", encoding="utf-8")
+    f = open(output_path, "w", encoding="utf-8")
     prof_ids = set(rasp.professor_id for rasp in rasps)
     for prof_id in prof_ids:
         for week in range(NUM_WEEKS):